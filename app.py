@@ -1,12 +1,26 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 import pickle
 import numpy as np
 import os
 import json
 import time
+import threading
+import functools
+import signal
+import xxhash
 import firebase_admin
 from firebase_admin import credentials, auth, firestore
+from backends import BACKENDS, CascadeBackend, NaiveBayesBackend, TransformerBackend
+from inference import FusedScorer
+from model_bundle import MANIFEST_FILE, load_bundle
+from model_registry import ModelRegistry, ModelReloader, ModelSlot, ServedModel
+from prediction_cache import PredictionCache
+from preprocessing import clean_texts
+from batcher import MicroBatcher
+import ndjson_stream
+from metrics import REGISTRY, Counter, Gauge, Histogram
+import thread_budget
 
 # ------------------------------------------------------------
 # 🔹 Initialize Flask App
@@ -15,40 +29,230 @@ app = Flask(__name__)
 CORS(app)
 
 # ------------------------------------------------------------
-# 🔹 Initialize Firebase Admin SDK (Safe + Retry)
+# 🔹 Metrics (exposed on /metrics in Prometheus format)
 # ------------------------------------------------------------
-for attempt in range(3):
-    try:
-        if "FIREBASE_CREDENTIALS" in os.environ:
-            cred_dict = json.loads(os.environ["FIREBASE_CREDENTIALS"])
-            cred = credentials.Certificate(cred_dict)
-        else:
-            cred = credentials.Certificate("firebase_admin_key.json")
+REQUEST_SECONDS = Histogram(
+    "emotion_request_seconds", "Request handling time per endpoint",
+    labelnames=("endpoint", "status"))
+STAGE_SECONDS = Histogram(
+    "emotion_predict_stage_seconds", "Time per stage of the prediction path",
+    labelnames=("stage",))
+FIRESTORE_SECONDS = Histogram(
+    "emotion_firestore_seconds", "Time per Firestore / Firebase Auth call",
+    labelnames=("operation",))
+CACHE_EVENTS = Counter(
+    "emotion_prediction_cache_events_total", "Prediction cache hits, misses, evictions and rejections",
+    labelnames=("event",))
+CACHE_ENTRIES = Gauge(
+    "emotion_prediction_cache_entries", "Entries held by the prediction caches")
+STREAM_ITEMS = Counter(
+    "emotion_stream_items_total", "Lines answered by /predict/stream",
+    labelnames=("outcome",))
+STREAM_ACTIVE = Gauge(
+    "emotion_stream_active", "Open /predict/stream responses")
 
-        if not firebase_admin._apps:
-            firebase_admin.initialize_app(cred)
+STAGE_PARSE = STAGE_SECONDS.labels(stage="parse")
+STAGE_CLEAN = STAGE_SECONDS.labels(stage="clean")
+STAGE_CACHE = STAGE_SECONDS.labels(stage="cache")
+STAGE_VECTORIZE = STAGE_SECONDS.labels(stage="vectorize")
+STAGE_SCORE = STAGE_SECONDS.labels(stage="score")
+STAGE_DECODE = STAGE_SECONDS.labels(stage="decode")
+STAGE_SERIALIZE = STAGE_SECONDS.labels(stage="serialize")
 
-        db = firestore.client()
-        print("✅ Firebase initialized successfully.")
-        break
-    except Exception as e:
-        print(f"⚠️ Firebase initialization failed (attempt {attempt+1}/3): {e}")
-        db = None
-        time.sleep(2)
-else:
-    print("❌ Firebase failed to initialize after 3 attempts.")
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get("request_started")
+    if started is not None:
+        REQUEST_SECONDS.labels(
+            endpoint=request.endpoint or "unknown", status=response.status_code
+        ).observe(time.perf_counter() - started)
+
+    # The cache keeps its own totals; mirror them into this worker's slots
+    if prediction_cache.enabled:
+        for event in ("hits", "misses", "evictions", "rejections"):
+            CACHE_EVENTS.labels(event=event).set_total(getattr(prediction_cache, event))
+        CACHE_ENTRIES.set(len(prediction_cache.entries))
+    return response
+
+# ------------------------------------------------------------
+# 🔹 Initialize Firebase Admin SDK (Background + Backoff)
+# ------------------------------------------------------------
+# Firebase is set up on a background thread with exponential backoff, so a
+# missing or slow credential never delays model loading or /predict.
+# Admin routes answer 503 until Firestore is ready.
+FIREBASE_INIT_ATTEMPTS = int(os.environ.get("FIREBASE_INIT_ATTEMPTS", 5))
+FIREBASE_INIT_BACKOFF = float(os.environ.get("FIREBASE_INIT_BACKOFF", 1.0))
+FIREBASE_INIT_MAX_BACKOFF = 30.0
+
+db = None
+firebase_state = {"status": "initializing", "attempts": 0, "error": None}
+firebase_init_lock = threading.Lock()
+firebase_init_pid = None
+
+def init_firebase():
+    global db
+    delay = FIREBASE_INIT_BACKOFF
+    for attempt in range(1, FIREBASE_INIT_ATTEMPTS + 1):
+        firebase_state["attempts"] = attempt
+        try:
+            if "FIREBASE_CREDENTIALS" in os.environ:
+                cred_dict = json.loads(os.environ["FIREBASE_CREDENTIALS"])
+                cred = credentials.Certificate(cred_dict)
+            else:
+                cred = credentials.Certificate("firebase_admin_key.json")
+
+            if not firebase_admin._apps:
+                firebase_admin.initialize_app(cred)
+
+            db = firestore.client()
+            firebase_state.update(status="ready", error=None)
+            print("✅ Firebase initialized successfully.")
+            return
+        except Exception as e:
+            firebase_state["error"] = str(e)
+            print(f"⚠️ Firebase initialization failed (attempt {attempt}/{FIREBASE_INIT_ATTEMPTS}): {e}")
+            if attempt < FIREBASE_INIT_ATTEMPTS:
+                time.sleep(delay)
+                delay = min(delay * 2, FIREBASE_INIT_MAX_BACKOFF)
+
+    firebase_state["status"] = "failed"
+    print(f"❌ Firebase failed to initialize after {FIREBASE_INIT_ATTEMPTS} attempts.")
+
+def start_firebase_init():
+    # Once per process: gRPC clients and threads do not survive fork
+    global firebase_init_pid
+    with firebase_init_lock:
+        if firebase_init_pid == os.getpid():
+            return
+        firebase_init_pid = os.getpid()
+        firebase_state.update(status="initializing", attempts=0, error=None)
+        threading.Thread(target=init_firebase, name="firebase-init", daemon=True).start()
+
+def require_firestore(view):
+    # Fast 503 for admin routes while Firestore is unavailable
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if db is None:
+            return jsonify({"error": "Firestore not ready", "firebase": firebase_state}), 503
+        return view(*args, **kwargs)
+    return wrapper
+
+# Under gunicorn the workers start it after fork (see gunicorn.conf.py)
+if os.environ.get("FIREBASE_INIT_DEFERRED") != "1":
+    start_firebase_init()
 
 # ------------------------------------------------------------
 # 🔹 Load Machine Learning Model
 # ------------------------------------------------------------
+# Serving a bundle needs only NumPy (model_bundle.py + inference.py).
+# sklearn (and with it scipy and pandas) is imported only when the .pkl
+# files are unpickled: without a bundle or with INFERENCE_ENGINE=sklearn.
+MODEL_FILES = ("emotion_model.pkl", "vectorizer.pkl", "label_encoder.pkl")
+
+def artifact_version(paths):
+    # Content hash of the model artifacts, so caches can tell models apart
+    digest = xxhash.xxh3_64()
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+MODEL_BUNDLE = os.environ.get("MODEL_BUNDLE", "model_bundle")
+INFERENCE_ENGINE = os.environ.get("INFERENCE_ENGINE", "fused")
+
+# Versioned registry (model_registry.py): when it has an ACTIVE version,
+# that bundle is served instead of MODEL_BUNDLE and can be swapped live
+MODEL_REGISTRY = os.environ.get("MODEL_REGISTRY", "model_registry")
+registry = ModelRegistry(MODEL_REGISTRY)
+registry_version = registry.active() if registry.exists() else None
+bundle_path = registry.path(registry_version) if registry_version else MODEL_BUNDLE
+
+model = vectorizer = label_encoder = scorer = None
+emotion_labels = model_version = None
+
 try:
-    model = pickle.load(open("emotion_model.pkl", "rb"))
-    vectorizer = pickle.load(open("vectorizer.pkl", "rb"))
-    label_encoder = pickle.load(open("label_encoder.pkl", "rb"))
-    print("✅ ML Models loaded successfully.")
+    if INFERENCE_ENGINE == "fused" and os.path.exists(os.path.join(bundle_path, MANIFEST_FILE)):
+        # Memory-mapped bundle: nothing to unpickle, and the weights are
+        # shared page cache across every worker process
+        bundle = load_bundle(bundle_path)
+        scorer = FusedScorer.from_bundle(bundle)
+        emotion_labels = bundle.labels
+        model_version = bundle.version
+        print(f"✅ Model bundle loaded successfully (version {model_version}).")
+    else:
+        model = pickle.load(open("emotion_model.pkl", "rb"))
+        vectorizer = pickle.load(open("vectorizer.pkl", "rb"))
+        label_encoder = pickle.load(open("label_encoder.pkl", "rb"))
+        # Decoded label for every model output column, so a prediction is
+        # just an argmax over the probability row
+        emotion_labels = label_encoder.inverse_transform(model.classes_)
+        model_version = artifact_version(MODEL_FILES)
+        print(f"✅ ML Models loaded successfully (version {model_version}).")
 except Exception as e:
     print(f"❌ Error loading ML models: {e}")
-    model = vectorizer = label_encoder = None
+    model = vectorizer = label_encoder = scorer = None
+    emotion_labels = model_version = None
+
+# Fused scorer is the default engine; INFERENCE_ENGINE=sklearn keeps the
+# plain vectorizer.transform() + predict_proba() path on the pickles
+if scorer is None and model is not None and INFERENCE_ENGINE == "fused":
+    try:
+        scorer = FusedScorer.from_sklearn(vectorizer, model)
+        print("✅ Fused inference engine ready.")
+    except Exception as e:
+        print(f"⚠️ Fused engine unavailable, using sklearn path: {e}")
+
+# ------------------------------------------------------------
+# 🔹 Select Serving Backend
+# ------------------------------------------------------------
+# MODEL_BACKEND=nb (default) serves the model above, =transformer a local
+# transformer classifier and =cascade both, gated on NB confidence
+# (see backends.py)
+MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "nb")
+if MODEL_BACKEND not in BACKENDS:
+    raise ValueError(f"MODEL_BACKEND must be one of {BACKENDS}, got {MODEL_BACKEND!r}")
+
+def select_backend(nb, slow=None):
+    # The backend MODEL_BACKEND serves, around the NB model `nb`; `slow` is
+    # a loaded transformer tier for the cascade to reuse
+    if MODEL_BACKEND == "nb":
+        return nb
+    if MODEL_BACKEND == "transformer":
+        return TransformerBackend.from_env()
+    # Cascade: NB answers confident texts, the transformer the rest
+    if nb is None:
+        raise RuntimeError("cascade needs the NB model as its fast tier")
+    return CascadeBackend.from_env(nb, slow)
+
+nb_backend = None
+if scorer is not None or model is not None:
+    nb_backend = NaiveBayesBackend(
+        emotion_labels, model_version, scorer=scorer, model=model, vectorizer=vectorizer)
+
+backend = nb_backend
+if MODEL_BACKEND != "nb":
+    try:
+        backend = select_backend(nb_backend)
+        emotion_labels = backend.labels
+        model_version = backend.version
+        print(f"✅ {MODEL_BACKEND.capitalize()} backend loaded (version {model_version}).")
+    except Exception as e:
+        print(f"❌ Error loading {MODEL_BACKEND} backend: {e}")
+        backend = None
+        emotion_labels = model_version = None
+
+model_ready = backend is not None
+
+# In-process result cache; set PREDICTION_CACHE_ENTRIES=0 to disable
+prediction_cache = PredictionCache(
+    max_entries=int(os.environ.get("PREDICTION_CACHE_ENTRIES", 10000)),
+    max_bytes=int(float(os.environ.get("PREDICTION_CACHE_MB", 32)) * 1024 * 1024),
+)
+prediction_cache.set_model_version(model_version)
 
 # ------------------------------------------------------------
 # 🔹 Base Route
@@ -57,47 +261,413 @@ except Exception as e:
 def home():
     return jsonify({"message": "Emotion Recognition API is running!"})
 
+# ------------------------------------------------------------
+# 🔹 Health Checks
+# ------------------------------------------------------------
+# /healthz: the process is up. /readyz: the model can serve /predict;
+# Firebase state is reported but does not gate readiness.
+@app.route('/healthz')
+def healthz():
+    return jsonify({"status": "ok"}), 200
+
+@app.route('/readyz')
+def readyz():
+    with model_slot.acquire() as served:
+        body = {
+            "model": "ready" if served is not None else "unavailable",
+            "model_version": served.version if served is not None else None,
+            "backend": MODEL_BACKEND,
+            "firebase": firebase_state["status"],
+        }
+    return jsonify(body), 200 if served is not None else 503
+
+# ------------------------------------------------------------
+# 🔹 Scoring Helpers
+# ------------------------------------------------------------
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 1000))
+
+def compute_distribution(backend, texts):
+    # One feature pass and one scoring pass: the class distribution is
+    # computed once and both the label and the confidence come from it
+    with STAGE_VECTORIZE.time():
+        features = backend.prepare(texts)
+    with STAGE_SCORE.time():
+        return backend.score(features)
+
+# Micro-batching: with MICROBATCH_WINDOW_MS > 0, concurrent /predict calls
+# wait up to that long (or for MICROBATCH_MAX_ITEMS texts) and are scored
+# together as one matrix
+MICROBATCH_WINDOW_MS = float(os.environ.get("MICROBATCH_WINDOW_MS", 0))
+MICROBATCH_MAX_ITEMS = int(os.environ.get("MICROBATCH_MAX_ITEMS", 64))
+
+def serve(backend):
+    # Each served model version gets its own micro-batcher, so one batch
+    # never mixes texts scored by two versions
+    batcher = None
+    if MICROBATCH_WINDOW_MS > 0:
+        batcher = MicroBatcher(
+            functools.partial(compute_distribution, backend),
+            window_ms=MICROBATCH_WINDOW_MS,
+            max_items=MICROBATCH_MAX_ITEMS,
+        )
+    return ServedModel(backend, backend.version, batcher)
+
+# Requests take the current model from the slot and keep it until they
+# have answered; a reload swaps the slot (see Model Registry below)
+model_slot = ModelSlot(serve(backend) if model_ready else None)
+
+# ------------------------------------------------------------
+# 🔹 Model Registry (hot swap)
+# ------------------------------------------------------------
+# With a registry, a new version is loaded next to the serving one,
+# checked on the golden set and swapped in without dropping requests.
+# Triggers: SIGHUP to the process (each gunicorn worker), POST
+# /admin/model/reload, or a changed ACTIVE pointer (checked every
+# MODEL_REGISTRY_POLL_S seconds, so all workers follow one activation).
+# The transformer-only backend has no NB model to swap.
+MODEL_REGISTRY_POLL_S = float(os.environ.get("MODEL_REGISTRY_POLL_S", 5))
+MODEL_ADMIN_TOKEN = os.environ.get("MODEL_ADMIN_TOKEN")
+hot_swap = registry.exists() and MODEL_BACKEND != "transformer" and INFERENCE_ENGINE == "fused"
+
+def build_served(version):
+    bundle = registry.load(version)
+    nb = NaiveBayesBackend(bundle.labels, bundle.version, scorer=FusedScorer.from_bundle(bundle))
+    current = model_slot.current
+    slow = getattr(current.backend, "slow", None) if current is not None else None
+    return serve(select_backend(nb, slow))
+
+def on_model_swap(served):
+    prediction_cache.set_model_version(served.version)
+
+reloader = ModelReloader(
+    registry, model_slot, build_served, loaded=registry_version,
+    min_accuracy=float(os.environ.get("MODEL_GOLDEN_MIN_ACCURACY", 0.0)),
+    on_swap=on_model_swap,
+)
+
+def start_model_watch():
+    # Per process, after fork: catch up with ACTIVE, then keep following it
+    if not hot_swap:
+        return
+    reloader.reload()
+    if MODEL_REGISTRY_POLL_S > 0:
+        reloader.watch(MODEL_REGISTRY_POLL_S)
+
+def install_reload_signal():
+    # Must run in the main thread (gunicorn.conf.py: post_worker_init)
+    if hot_swap and hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, lambda signum, frame: reloader.reload())
+        signal.siginterrupt(signal.SIGHUP, False)
+
+def score_distribution(served, texts, coalesce=False, use_cache=True):
+    # Clean the texts exactly as train_model.py did (NB backend), then serve
+    # repeated texts from the cache and score only the misses, in one pass
+    backend = served.backend
+    if backend.clean_input:
+        with STAGE_CLEAN.time():
+            texts = clean_texts(texts)
+
+    compute = functools.partial(compute_distribution, backend)
+    if coalesce and served.batcher is not None:
+        compute = lambda texts: np.vstack(served.batcher.submit_many(texts))
+
+    if not prediction_cache.enabled or not use_cache:
+        return compute(texts)
+
+    with STAGE_CACHE.time():
+        keys = [prediction_cache.key(text, served.version, backend.clean_input) for text in texts]
+        rows = [prediction_cache.get(key) for key in keys]
+        missing = [i for i, row in enumerate(rows) if row is None]
+
+    if missing:
+        computed = compute([texts[i] for i in missing])
+        for i, row in zip(missing, computed):
+            # A copy, so the cached row does not keep the whole batch's
+            # matrix alive behind the bytes put() accounts for
+            row = row.copy()
+            row.flags.writeable = False
+            prediction_cache.put(keys[i], row)
+            rows[i] = row
+
+    return np.vstack(rows)
+
+def format_prediction(emotion_labels, probabilities, top_k=None, return_distribution=False):
+    best = int(np.argmax(probabilities))
+    result = {
+        "emotion": emotion_labels[best],
+        "confidence": float(probabilities[best])
+    }
+
+    if top_k:
+        ranked = np.argsort(-probabilities, kind="stable")[:top_k]
+        result["top"] = [
+            {"emotion": emotion_labels[i], "confidence": float(probabilities[i])}
+            for i in ranked
+        ]
+
+    if return_distribution:
+        result["distribution"] = {
+            emotion: float(p) for emotion, p in zip(emotion_labels, probabilities)
+        }
+
+    return result
+
+def score_texts(served, texts, top_k=None, return_distribution=False, coalesce=False, use_cache=True):
+    probabilities = score_distribution(served, texts, coalesce, use_cache)
+    with STAGE_DECODE.time():
+        return [format_prediction(served.labels, row, top_k, return_distribution) for row in probabilities]
+
+def batch_entry(item, position):
+    # (id, stripped text, error) for one {"id": ..., "text": ...} item
+    item_id = item.get('id', position) if isinstance(item, dict) else position
+    text = item.get('text') if isinstance(item, dict) else None
+    if not isinstance(text, str) or not text.strip():
+        return item_id, None, "No text provided"
+    return item_id, text.strip(), None
+
+def score_items(served, entries, top_k=None, return_distribution=False, use_cache=True):
+    # Results for (id, text, error) entries, in input order. Duplicate texts
+    # are scored once and all texts in one pass; if that pass fails they are
+    # retried one by one, so a single bad item cannot fail the whole batch
+    unique_texts = {}
+    for _, text, _ in entries:
+        if text is not None:
+            unique_texts.setdefault(text, len(unique_texts))
+
+    texts = list(unique_texts)
+    scored = []
+    if texts:
+        try:
+            scored = score_texts(served, texts, top_k, return_distribution, use_cache=use_cache)
+        except Exception as e:
+            print(f"⚠️ Batch scoring failed, retrying per item: {e}")
+            for text in texts:
+                try:
+                    scored.append(score_texts(served, [text], top_k, return_distribution, use_cache=use_cache)[0])
+                except Exception as item_error:
+                    print(f"❌ Prediction error: {item_error}")
+                    scored.append({"error": "Model error"})
+
+    results = []
+    for item_id, text, error in entries:
+        if text is None:
+            results.append({"id": item_id, "error": error})
+        else:
+            results.append({"id": item_id, **scored[unique_texts[text]]})
+    return results
+
+def parse_output_options(data, emotion_labels):
+    # Optional response extras shared by /predict and /predict/batch
+    top_k = data.get('top_k')
+    if top_k is not None:
+        if isinstance(top_k, bool) or not isinstance(top_k, int) or top_k < 1:
+            raise ValueError("top_k must be a positive integer")
+        top_k = min(top_k, len(emotion_labels))
+
+    return_distribution = data.get('return_distribution', False)
+    if not isinstance(return_distribution, bool):
+        raise ValueError("return_distribution must be true or false")
+
+    return top_k, return_distribution
+
 # ------------------------------------------------------------
 # 🔹 Predict Emotion
 # ------------------------------------------------------------
 @app.route('/predict', methods=['POST'])
 def predict():
     try:
-        data = request.get_json()
-        text = data.get('text', '').strip()
+        with STAGE_PARSE.time():
+            data = request.get_json()
+            text = data.get('text', '').strip()
 
         if not text:
             return jsonify({"error": "No text provided"}), 400
 
-        text_vec = vectorizer.transform([text])
-        prediction = model.predict(text_vec)
-        emotion = label_encoder.inverse_transform(prediction)[0]
-
-        if hasattr(model, "predict_proba"):
-            probabilities = model.predict_proba(text_vec)
-            confidence = float(np.max(probabilities))
-        else:
-            confidence = 1.0
+        with model_slot.acquire() as served:
+            if served is None:
+                return jsonify({"error": "Model not loaded"}), 503
+            try:
+                top_k, return_distribution = parse_output_options(data, served.labels)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
 
-        return jsonify({
-            "emotion": emotion,
-            "confidence": confidence
-        }), 200
+            result = score_texts(served, [text], top_k, return_distribution, coalesce=True)[0]
+            result["model_version"] = served.version
+        with STAGE_SERIALIZE.time():
+            response = jsonify(result)
+        return response, 200
 
     except Exception as e:
         print(f"❌ Prediction error: {e}")
         return jsonify({"error": "Model error"}), 500
 
+# ------------------------------------------------------------
+# 🔹 Batch Predict Emotion
+# ------------------------------------------------------------
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    try:
+        with STAGE_PARSE.time():
+            data = request.get_json(silent=True) or {}
+        items = data.get('items')
+        if items is None and isinstance(data.get('texts'), list):
+            items = [{"id": i, "text": t} for i, t in enumerate(data['texts'])]
+
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "No items provided"}), 400
+        if len(items) > MAX_BATCH_SIZE:
+            return jsonify({"error": f"Too many items (max {MAX_BATCH_SIZE})"}), 413
+
+        with model_slot.acquire() as served:
+            if served is None:
+                return jsonify({"error": "Model not loaded"}), 503
+            try:
+                top_k, return_distribution = parse_output_options(data, served.labels)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+            entries = [batch_entry(item, position) for position, item in enumerate(items)]
+            results = score_items(served, entries, top_k, return_distribution)
+
+            with STAGE_SERIALIZE.time():
+                response = jsonify({"results": results, "count": len(results), "model_version": served.version})
+            return response, 200
+
+    except Exception as e:
+        print(f"❌ Batch prediction error: {e}")
+        return jsonify({"error": "Model error"}), 500
+
+# ------------------------------------------------------------
+# 🔹 Streaming Bulk Predict (NDJSON)
+# ------------------------------------------------------------
+# POST /predict/stream takes NDJSON ({"id": ..., "text": ...} or a JSON
+# string per line), plain or gzip, with a Content-Length or chunked, and
+# answers with one NDJSON result per line, in order, while the body is
+# still arriving. Lines are scored STREAM_BATCH_SIZE at a time, and the
+# next batch is read only once the server has taken the previous results:
+# a client that stops reading stops the upload (backpressure), and memory
+# stays at one batch whatever the payload size. Bulk texts bypass the
+# prediction cache and the micro-batcher, so an archive run cannot evict
+# the interactive traffic's entries. The model version is fixed for the
+# whole stream (a hot swap waits for it to finish).
+STREAM_BATCH_SIZE = int(os.environ.get("STREAM_BATCH_SIZE", 256))
+STREAM_MAX_ITEMS = int(os.environ.get("STREAM_MAX_ITEMS", 5_000_000))
+STREAM_MAX_LINE_BYTES = int(os.environ.get("STREAM_MAX_LINE_BYTES", 64 * 1024))
+# Streams per worker; further ones get 429, so bulk jobs cannot take every
+# thread away from /predict
+STREAM_CONCURRENCY = int(os.environ.get("STREAM_CONCURRENCY", 1))
+stream_slots = threading.BoundedSemaphore(STREAM_CONCURRENCY)
+STREAM_SCORED = STREAM_ITEMS.labels(outcome="scored")
+STREAM_ERRORS = STREAM_ITEMS.labels(outcome="error")
+
+def parse_stream_options(args, emotion_labels):
+    # ?top_k=N&return_distribution=true, the /predict options as query
+    # parameters (the body is the stream)
+    options = {}
+    if "top_k" in args:
+        try:
+            options["top_k"] = int(args["top_k"])
+        except ValueError:
+            raise ValueError("top_k must be a positive integer")
+    if "return_distribution" in args:
+        value = args["return_distribution"].lower()
+        if value not in ("true", "false", "1", "0"):
+            raise ValueError("return_distribution must be true or false")
+        options["return_distribution"] = value in ("true", "1")
+    return parse_output_options(options, emotion_labels)
+
+def format_stream_batch(served, entries, top_k, return_distribution):
+    results = score_items(served, entries, top_k, return_distribution, use_cache=False)
+    errors = sum("error" in result for result in results)
+    STREAM_ERRORS.inc(errors)
+    STREAM_SCORED.inc(len(results) - errors)
+    with STAGE_SERIALIZE.time():
+        return "".join(json.dumps(result) + "\n" for result in results)
+
+def stream_results(served, lines, top_k, return_distribution):
+    # One chunk of NDJSON per scored batch. A problem with the stream itself
+    # (item cap, bad gzip) ends it with {"error": ..., "count": lines read}
+    entries, position, error = [], 0, None
+    try:
+        for line in lines:
+            if position == STREAM_MAX_ITEMS:
+                error = f"Too many items (max {STREAM_MAX_ITEMS})"
+                break
+            item, parse_error = ndjson_stream.parse_line(line)
+            entries.append((position, None, parse_error) if parse_error else batch_entry(item, position))
+            position += 1
+            if len(entries) == STREAM_BATCH_SIZE:
+                yield format_stream_batch(served, entries, top_k, return_distribution)
+                entries = []
+    except ndjson_stream.StreamError as e:
+        error = str(e)
+
+    if entries:
+        yield format_stream_batch(served, entries, top_k, return_distribution)
+    if error:
+        print(f"⚠️ Stream ended after {position} lines: {error}")
+        yield json.dumps({"error": error, "count": position}) + "\n"
+
+@app.route('/predict/stream', methods=['POST'])
+def predict_stream():
+    encoding = request.headers.get("Content-Encoding", "identity").lower()
+    if encoding not in ("identity",) + ndjson_stream.GZIP_ENCODINGS:
+        return jsonify({"error": f"Unsupported Content-Encoding {encoding!r}"}), 415
+    if not stream_slots.acquire(blocking=False):
+        return jsonify({"error": "Too many concurrent streams"}), 429, {"Retry-After": "1"}
+
+    # The lease and the stream slot are held until the server closes the
+    # response, i.e. after the last line or when the client goes away
+    lease = model_slot.acquire()
+    served = lease.__enter__()
+    STREAM_ACTIVE.inc()
+
+    def release():
+        lease.__exit__(None, None, None)
+        stream_slots.release()
+        STREAM_ACTIVE.inc(-1)
+
+    response = None
+    try:
+        if served is None:
+            return jsonify({"error": "Model not loaded"}), 503
+        try:
+            top_k, return_distribution = parse_stream_options(request.args, served.labels)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        chunks = ndjson_stream.read_chunks(request.stream, gzipped=encoding in ndjson_stream.GZIP_ENCODINGS)
+        lines = ndjson_stream.read_lines(chunks, STREAM_MAX_LINE_BYTES)
+        response = Response(
+            stream_with_context(stream_results(served, lines, top_k, return_distribution)),
+            mimetype="application/x-ndjson",
+            headers={"X-Model-Version": served.version, "X-Accel-Buffering": "no"},
+        )
+        response.call_on_close(release)
+        return response
+    finally:
+        if response is None:
+            release()
+
+# ------------------------------------------------------------
+# 🔹 Prometheus Metrics
+# ------------------------------------------------------------
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
 # ------------------------------------------------------------
 # 🔹 ADMIN FEATURES
 # ------------------------------------------------------------
 
 # ✅ Fetch all users
 @app.route('/admin/get_users', methods=['GET'])
+@require_firestore
 def get_users():
     try:
         users = []
-        docs = db.collection("users").get()
+        with FIRESTORE_SECONDS.labels(operation="get_users").time():
+            docs = db.collection("users").get()
         for doc in docs:
             user_data = doc.to_dict()
             user_data["uid"] = doc.id
@@ -109,6 +679,7 @@ def get_users():
 
 # ✅ Delete user (Firebase Auth + Firestore + global history)
 @app.route('/admin/delete_user', methods=['POST'])
+@require_firestore
 def delete_user():
     try:
         data = request.get_json()
@@ -119,7 +690,8 @@ def delete_user():
         # 1️⃣ Delete from Firebase Authentication (retry up to 3 times)
         for i in range(3):
             try:
-                auth.delete_user(uid)
+                with FIRESTORE_SECONDS.labels(operation="auth_delete_user").time():
+                    auth.delete_user(uid)
                 print(f"🗑️ Firebase Auth: Deleted user {uid}")
                 break
             except Exception as e:
@@ -132,21 +704,24 @@ def delete_user():
         # 2️⃣ Delete user’s subcollections
         user_ref = db.collection("users").document(uid)
         try:
-            for subcol in user_ref.collections():
-                for doc in subcol.stream():
-                    doc.reference.delete()
+            with FIRESTORE_SECONDS.labels(operation="delete_subcollections").time():
+                for subcol in user_ref.collections():
+                    for doc in subcol.stream():
+                        doc.reference.delete()
         except Exception as e:
             print(f"⚠️ Failed to delete subcollections for {uid}: {e}")
 
         # 3️⃣ Delete Firestore document
-        user_ref.delete()
+        with FIRESTORE_SECONDS.labels(operation="delete_user_document").time():
+            user_ref.delete()
 
         # 4️⃣ Delete from global history
         deleted_count = 0
-        history_docs = db.collection("history").where("userId", "==", uid).stream()
-        for doc in history_docs:
-            doc.reference.delete()
-            deleted_count += 1
+        with FIRESTORE_SECONDS.labels(operation="delete_history").time():
+            history_docs = db.collection("history").where("userId", "==", uid).stream()
+            for doc in history_docs:
+                doc.reference.delete()
+                deleted_count += 1
 
         print(f"✅ Deleted {uid} with {deleted_count} related history records.")
         return jsonify({
@@ -160,6 +735,7 @@ def delete_user():
 
 # ✅ Update user (role or name)
 @app.route('/admin/update_user', methods=['POST'])
+@require_firestore
 def update_user():
     try:
         data = request.get_json()
@@ -179,7 +755,8 @@ def update_user():
         if not update_data:
             return jsonify({"error": "No data to update"}), 400
 
-        db.collection("users").document(uid).update(update_data)
+        with FIRESTORE_SECONDS.labels(operation="update_user").time():
+            db.collection("users").document(uid).update(update_data)
         print(f"✅ Updated user {uid} with data: {update_data}")
         return jsonify({"message": "User updated successfully."}), 200
 
@@ -187,11 +764,65 @@ def update_user():
         print(f"❌ Error updating user: {e}")
         return jsonify({"error": str(e)}), 500
 
+# ✅ Prediction cache statistics
+@app.route('/admin/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify(prediction_cache.stats()), 200
+
+# ✅ Serving backend settings (for the cascade also the escalation rate
+# and per-tier latency)
+@app.route('/admin/backend_stats', methods=['GET'])
+def backend_stats():
+    # Under a lease: a concurrent swap releases the old backend
+    with model_slot.acquire() as served:
+        if served is None:
+            return jsonify({"backend": MODEL_BACKEND, "ready": False}), 503
+        return jsonify(served.backend.info()), 200
+
+# ✅ Micro-batching statistics (batch sizes and queue waits)
+@app.route('/admin/batcher_stats', methods=['GET'])
+def batcher_stats():
+    with model_slot.acquire() as served:
+        if served is None or served.batcher is None:
+            return jsonify({"enabled": False}), 200
+        return jsonify({"enabled": True, **served.batcher.stats()}), 200
+
+# ✅ Model registry: serving version, registry versions, last reload
+@app.route('/admin/model', methods=['GET'])
+def model_info():
+    served = model_slot.current
+    return jsonify({
+        "hot_swap": hot_swap,
+        "model_version": served.version if served is not None else None,
+        "registry_version": reloader.loaded,
+        "in_flight": served.in_flight if served is not None else 0,
+        "active": registry.active(),
+        "versions": registry.versions(),
+        "reload": reloader.status,
+    }), 200
+
+# ✅ Load, validate and swap in a registry version (default: ACTIVE); with
+# "version", ACTIVE is moved to it once it passes, so every worker follows
+@app.route('/admin/model/reload', methods=['POST'])
+def model_reload():
+    if MODEL_ADMIN_TOKEN and request.headers.get("X-Admin-Token") != MODEL_ADMIN_TOKEN:
+        return jsonify({"error": "Unauthorized"}), 401
+    if not hot_swap:
+        return jsonify({"error": "No model registry to reload from"}), 409
+
+    version = (request.get_json(silent=True) or {}).get("version")
+    if version is not None and version not in registry.versions():
+        return jsonify({"error": f"Unknown model version {version}"}), 404
+    started = reloader.reload(version, activate=version is not None)
+    return jsonify({"started": started, "reload": reloader.status}), 202 if started else 200
+
 # ✅ Test Firebase connection
 @app.route("/admin/test_firebase")
+@require_firestore
 def test_firebase():
     try:
-        user_list = [u.uid for u in auth.list_users().iterate_all()]
+        with FIRESTORE_SECONDS.labels(operation="auth_list_users").time():
+            user_list = [u.uid for u in auth.list_users().iterate_all()]
         return jsonify({"users_found": len(user_list)}), 200
     except Exception as e:
         return jsonify({"firebase_error": str(e)}), 500
@@ -200,5 +831,8 @@ def test_firebase():
 # 🔹 Run Flask App
 # ------------------------------------------------------------
 if __name__ == '__main__':
+    thread_budget.publish()
+    start_model_watch()
+    install_reload_signal()
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port)
\ No newline at end of file
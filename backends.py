@@ -0,0 +1,296 @@
+import json
+import os
+import time
+import numpy as np
+import xxhash
+
+from batcher import MicroBatcher
+from metrics import Counter, Histogram
+from preprocessing import clean_texts
+
+# ------------------------------------------------------------
+# 🔹 Inference Backends
+# ------------------------------------------------------------
+# app.py scores through one backend object, picked per deployment with
+# MODEL_BACKEND:
+#   nb           TF-IDF + MultinomialNB (fused scorer or sklearn pickles)
+#   transformer  a local fine-tuned transformer classifier on CPU
+#   cascade      NB first; only texts it is unsure about go to the
+#                transformer
+#
+# A backend has:
+#   labels        emotion name of every output column
+#   version       content hash of its artifacts (keys the prediction cache)
+#   clean_input   whether texts go through preprocessing.clean_text first
+#                 (the NB model was trained on cleaned text; a transformer
+#                 wants the original casing and punctuation)
+#   prepare(texts)     -> features   (timed as the "vectorize" stage)
+#   score(features)    -> (n_texts, n_labels) probability rows ("score")
+#   predict_proba(texts) = score(prepare(texts))
+#
+# torch and transformers are imported only when the transformer backend is
+# created, so the NB deployment does not pay for them.
+
+BACKENDS = ("nb", "transformer", "cascade")
+
+CASCADE_TIER_SECONDS = Histogram(
+    "emotion_cascade_tier_seconds", "Time per cascade tier call (fast: all texts, slow: escalated)",
+    labelnames=("tier",))
+CASCADE_TEXTS = Counter(
+    "emotion_cascade_texts_total", "Texts scored per cascade tier; slow / fast is the escalation rate",
+    labelnames=("tier",))
+
+
+class Backend:
+    name = None
+    clean_input = True
+
+    def prepare(self, texts):
+        raise NotImplementedError
+
+    def score(self, features):
+        raise NotImplementedError
+
+    def predict_proba(self, texts):
+        return self.score(self.prepare(texts))
+
+    def close(self):
+        # Release threads / resources when the backend is retired
+        pass
+
+    def info(self):
+        return {"backend": self.name, "version": self.version, "labels": len(self.labels)}
+
+
+class NaiveBayesBackend(Backend):
+    name = "nb"
+
+    def __init__(self, labels, version, scorer=None, model=None, vectorizer=None):
+        # Fused scorer when available, otherwise the sklearn objects
+        self.labels = labels
+        self.version = version
+        self.scorer = scorer
+        self.model = model
+        self.vectorizer = vectorizer
+
+    def prepare(self, texts):
+        if self.scorer is not None:
+            return self.scorer.transform(texts)
+        return self.vectorizer.transform(texts)
+
+    def score(self, features):
+        if self.scorer is not None:
+            return self.scorer.predict_proba_features(features)
+        if hasattr(self.model, "predict_proba"):
+            return self.model.predict_proba(features)
+
+        # Models without probabilities: all mass on the predicted class
+        predictions = np.searchsorted(self.model.classes_, self.model.predict(features))
+        probabilities = np.zeros((features.shape[0], len(self.model.classes_)))
+        probabilities[np.arange(features.shape[0]), predictions] = 1.0
+        return probabilities
+
+    def info(self):
+        return {**super().info(), "engine": "fused" if self.scorer is not None else "sklearn"}
+
+
+# Weight files hashed into the transformer backend's version
+TRANSFORMER_WEIGHT_FILES = ("model.safetensors", "pytorch_model.bin")
+
+
+class TransformerBackend(Backend):
+    # Sequence classifier from a local directory (save_pretrained output):
+    #   - nn.Linear layers quantized to int8 with dynamic quantization
+    #   - forward passes under torch.inference_mode()
+    #   - torch.set_num_threads(threads)
+    #   - texts are tokenized once without padding, sorted by token count
+    #     and cut into batches padded only to their own longest text, so
+    #     short texts are not padded to the length of the longest one
+    name = "transformer"
+    clean_input = False
+
+    def __init__(self, model_dir, threads=1, batch_size=32, max_length=128,
+                 quantize=True, labels=None):
+        import torch
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+        self.torch = torch
+        self.model_dir = model_dir
+        self.threads = threads
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.quantized = quantize
+
+        torch.set_num_threads(threads)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        model = AutoModelForSequenceClassification.from_pretrained(model_dir)
+        model.eval()
+        if quantize:
+            quantize_dynamic = getattr(torch.ao.quantization, "quantize_dynamic", None) \
+                or torch.quantization.quantize_dynamic
+            model = quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model
+
+        # Output columns follow `labels` when given (e.g. the NB model's
+        # order, so the two backends are interchangeable), else the model's
+        id2label = {int(i): label for i, label in model.config.id2label.items()}
+        own_labels = [id2label[i] for i in range(len(id2label))]
+        if labels is None:
+            self.labels = np.array(own_labels)
+            self.columns = None
+        else:
+            mismatched = set(map(str, labels)) ^ set(own_labels)
+            if mismatched:
+                raise ValueError(f"Transformer labels differ from the expected labels: {sorted(mismatched)}")
+            self.labels = np.asarray(labels)
+            self.columns = np.array([own_labels.index(str(label)) for label in labels])
+
+        self.version = self._version()
+
+    @classmethod
+    def from_env(cls, labels=None):
+        return cls(
+            os.environ.get("TRANSFORMER_MODEL_DIR", "transformer_model"),
+            threads=int(os.environ.get("TRANSFORMER_THREADS", 1)),
+            batch_size=int(os.environ.get("TRANSFORMER_BATCH_SIZE", 32)),
+            max_length=int(os.environ.get("TRANSFORMER_MAX_LENGTH", 128)),
+            quantize=os.environ.get("TRANSFORMER_QUANTIZE", "1") == "1",
+            labels=labels,
+        )
+
+    def _version(self):
+        digest = xxhash.xxh3_64()
+        with open(os.path.join(self.model_dir, "config.json"), "rb") as f:
+            digest.update(f.read())
+        for name in TRANSFORMER_WEIGHT_FILES:
+            path = os.path.join(self.model_dir, name)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    for block in iter(lambda: f.read(1 << 20), b""):
+                        digest.update(block)
+        digest.update(json.dumps([self.quantized, self.max_length]).encode())
+        return digest.hexdigest()
+
+    def prepare(self, texts):
+        encoded = self.tokenizer(
+            list(texts), truncation=True, max_length=self.max_length, padding=False)
+        input_ids = encoded["input_ids"]
+        order = sorted(range(len(input_ids)), key=lambda i: len(input_ids[i]))
+
+        batches = []
+        for start in range(0, len(order), self.batch_size):
+            indices = order[start:start + self.batch_size]
+            batch = self.tokenizer.pad(
+                {key: [encoded[key][i] for i in indices] for key in encoded.keys()},
+                padding="longest", return_tensors="pt",
+            )
+            batches.append((indices, batch))
+        return len(input_ids), batches
+
+    def score(self, features):
+        n_texts, batches = features
+        probabilities = np.zeros((n_texts, len(self.labels)))
+        torch = self.torch
+        with torch.inference_mode():
+            for indices, batch in batches:
+                logits = self.model(**batch).logits
+                rows = torch.softmax(logits.double(), dim=-1).numpy()
+                probabilities[indices] = rows if self.columns is None else rows[:, self.columns]
+        return probabilities
+
+    def info(self):
+        return {
+            **super().info(),
+            "model_dir": self.model_dir,
+            "threads": self.threads,
+            "batch_size": self.batch_size,
+            "max_length": self.max_length,
+            "quantized": self.quantized,
+        }
+
+
+class CascadeBackend(Backend):
+    # Confidence-gated cascade: every text is scored by the fast backend;
+    # rows whose top probability is below `threshold` are re-scored by the
+    # slow backend and replaced by its answer. Escalated texts are sent to
+    # the slow backend together: all of a request's uncertain texts in one
+    # call, and with window_ms > 0 also those of concurrent requests
+    # (through a MicroBatcher, up to max_items per batch).
+    name = "cascade"
+    clean_input = False  # each tier gets the input it was built for
+
+    def __init__(self, fast, slow, threshold, window_ms=0.0, max_items=32):
+        if list(map(str, fast.labels)) != list(map(str, slow.labels)):
+            raise ValueError("Cascade tiers must share the same label order")
+        self.fast = fast
+        self.slow = slow
+        self.threshold = threshold
+        self.labels = fast.labels
+        self.version = xxhash.xxh3_64_hexdigest(f"{fast.version}:{slow.version}:{threshold!r}")
+
+        self.slow_batcher = None
+        if window_ms > 0:
+            self.slow_batcher = MicroBatcher(
+                slow.predict_proba, window_ms=window_ms, max_items=max_items, name="cascade")
+
+        self.fast_seconds = CASCADE_TIER_SECONDS.labels(tier="fast")
+        self.slow_seconds = CASCADE_TIER_SECONDS.labels(tier="slow")
+        self.fast_texts = CASCADE_TEXTS.labels(tier="fast")
+        self.slow_texts = CASCADE_TEXTS.labels(tier="slow")
+        self.fast_total = self.slow_total = 0
+
+    @classmethod
+    def from_env(cls, fast, slow=None):
+        # `slow`: an already loaded transformer tier to reuse (model reloads)
+        return cls(
+            fast,
+            slow if slow is not None else TransformerBackend.from_env(labels=fast.labels),
+            threshold=float(os.environ.get("CASCADE_THRESHOLD", 0.5)),
+            window_ms=float(os.environ.get("CASCADE_WINDOW_MS", 2.0)),
+            max_items=int(os.environ.get("CASCADE_MAX_ITEMS", 32)),
+        )
+
+    def prepare(self, texts):
+        return list(texts)
+
+    def close(self):
+        # The slow tier may be shared with the next cascade; only the
+        # batcher belongs to this one
+        if self.slow_batcher is not None:
+            self.slow_batcher.close()
+
+    def _tier_input(self, backend, texts):
+        return clean_texts(texts) if backend.clean_input else texts
+
+    def score(self, texts):
+        with self.fast_seconds.time():
+            probabilities = self.fast.predict_proba(self._tier_input(self.fast, texts))
+        self.fast_texts.inc(len(texts))
+        self.fast_total += len(texts)
+
+        uncertain = np.flatnonzero(probabilities.max(axis=1) < self.threshold)
+        if len(uncertain):
+            escalated = self._tier_input(self.slow, [texts[i] for i in uncertain])
+            started = time.perf_counter()
+            if self.slow_batcher is not None:
+                rows = np.vstack(self.slow_batcher.submit_many(escalated))
+            else:
+                rows = self.slow.predict_proba(escalated)
+            self.slow_seconds.observe(time.perf_counter() - started)
+            self.slow_texts.inc(len(uncertain))
+            self.slow_total += len(uncertain)
+            probabilities[uncertain] = rows
+        return probabilities
+
+    def info(self):
+        return {
+            **super().info(),
+            "threshold": self.threshold,
+            "fast": self.fast.info(),
+            "slow": self.slow.info(),
+            "texts": self.fast_total,
+            "escalated": self.slow_total,
+            "escalation_rate": self.slow_total / self.fast_total if self.fast_total else 0.0,
+            "fast_tier_seconds": CASCADE_TIER_SECONDS.snapshot(tier="fast"),
+            "slow_tier_seconds": CASCADE_TIER_SECONDS.snapshot(tier="slow"),
+        }
@@ -0,0 +1,116 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from metrics import Histogram, SIZE_BUCKETS
+
+MICROBATCH_SIZE = Histogram(
+    "emotion_microbatch_size", "Texts scored together per micro-batch", SIZE_BUCKETS,
+    labelnames=("batcher",))
+MICROBATCH_QUEUE_WAIT = Histogram(
+    "emotion_microbatch_queue_wait_seconds", "Time a text waited for its micro-batch",
+    labelnames=("batcher",))
+
+# ------------------------------------------------------------
+# 🔹 Micro-Batching Scheduler
+# ------------------------------------------------------------
+# Concurrent /predict calls put their text on a queue and wait. A single
+# scheduler thread takes the first waiting item, keeps collecting until the
+# window closes or max_items are queued, scores everything as one matrix and
+# hands each row back to its caller.
+
+
+class MicroBatcher:
+    def __init__(self, score_fn, window_ms=2.0, max_items=64, name="predict"):
+        self.score_fn = score_fn
+        self.window = window_ms / 1000.0
+        self.max_items = max_items
+        self.name = name
+        self.pending = queue.Queue()
+        self.batch_size = MICROBATCH_SIZE.labels(batcher=name)
+        self.queue_wait = MICROBATCH_QUEUE_WAIT.labels(batcher=name)
+        self.thread = None
+        self.pid = None
+        self.start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Started lazily so a pre-forking server gets one scheduler thread per
+        # worker (threads do not survive fork)
+        if self.pid == os.getpid() and self.thread.is_alive():
+            return
+        with self.start_lock:
+            if self.pid != os.getpid() or not self.thread.is_alive():
+                if self.pid != os.getpid():
+                    self.pending = queue.Queue()
+                self.thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+                self.thread.start()
+                self.pid = os.getpid()
+
+    def submit(self, text, timeout=None):
+        return self.submit_many([text], timeout)[0]
+
+    def submit_many(self, texts, timeout=None):
+        # Queue every text before waiting, so they can share a batch
+        self._ensure_started()
+        queued_at = time.perf_counter()
+        futures = [Future() for _ in texts]
+        for text, future in zip(texts, futures):
+            self.pending.put((text, queued_at, future))
+        return [future.result(timeout) for future in futures]
+
+    def close(self):
+        # Stop the scheduler thread after the texts already queued; used
+        # when the model it scores for is retired
+        if self.thread is not None and self.pid == os.getpid():
+            self.pending.put(None)
+
+    def _collect(self):
+        first = self.pending.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_items:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self.pending.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self.pending.put(None)  # stop after this batch
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            for _, queued_at, _ in batch:
+                self.queue_wait.observe(started - queued_at)
+            self.batch_size.observe(len(batch))
+
+            try:
+                rows = self.score_fn([text for text, _, _ in batch])
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, _, future), row in zip(batch, rows):
+                future.set_result(row)
+
+    def stats(self):
+        return {
+            "window_ms": self.window * 1000.0,
+            "max_items": self.max_items,
+            "queued": self.pending.qsize(),
+            "batch_size": MICROBATCH_SIZE.snapshot(batcher=self.name),
+            "queue_wait_seconds": MICROBATCH_QUEUE_WAIT.snapshot(batcher=self.name),
+        }
@@ -0,0 +1,411 @@
+import argparse
+import json
+import os
+import pickle
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+# Benchmarks measure the model, not the cache or Firebase
+os.environ.setdefault("PREDICTION_CACHE_ENTRIES", "0")
+os.environ.setdefault("FIREBASE_INIT_ATTEMPTS", "1")
+
+import numpy as np
+
+from benchmarks.corpus import load_corpus
+
+# ------------------------------------------------------------
+# 🔹 Inference Benchmark Suite
+# ------------------------------------------------------------
+# Usage (from the repository root):
+#     python -m benchmarks.bench --output bench.json
+#     python -m benchmarks.bench --compare benchmarks/baseline.json
+#
+# Suites:
+#   stages     each step of the prediction path on its own
+#   preprocess clean_text throughput (rows/s) and train/serve parity
+#   endpoint   POST /predict end to end through Flask's test client
+#   batch      scoring throughput for batch sizes 1 .. 10k
+#   backends   every available serving backend (backends.py) on the same
+#              texts: NB fused, NB sklearn and, when TRANSFORMER_MODEL_DIR
+#              and torch are available, the transformer
+#   coldstart  fresh interpreter until the first prediction is returned
+#   imports    python -X importtime of app.py per engine, and whether
+#              sklearn / scipy / pandas were imported
+# Every result reports per-call timings in microseconds; compare mode
+# flags any median that got slower than the baseline by more than the
+# tolerance and exits non-zero.
+
+SUITES = ("stages", "preprocess", "endpoint", "batch", "backends", "coldstart", "imports")
+BATCH_SIZES = (1, 10, 100, 1000, 10000)
+BACKEND_BATCH_SIZE = 256
+
+
+def measure(fn, repeat, inner=1):
+    # Per-call timings in microseconds over `repeat` samples
+    fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(inner):
+            fn()
+        samples.append((time.perf_counter() - started) / inner * 1e6)
+    samples.sort()
+    return {
+        "median_us": statistics.median(samples),
+        "p90_us": samples[int(0.9 * (len(samples) - 1))],
+        "mean_us": statistics.fmean(samples),
+        "samples": len(samples),
+    }
+
+
+def cycle(texts, n):
+    return [texts[i % len(texts)] for i in range(n)]
+
+
+def bench_stages(texts, repeat):
+    from flask import jsonify
+    import app
+    from preprocessing import clean_text
+
+    model = pickle.load(open("emotion_model.pkl", "rb"))
+    vectorizer = pickle.load(open("vectorizer.pkl", "rb"))
+    label_encoder = pickle.load(open("label_encoder.pkl", "rb"))
+    scorer = app.scorer
+
+    results = {}
+    sample = texts[:200]
+    per_text = lambda fn: (lambda: [fn(t) for t in sample])
+
+    # Own key: "stage.clean" in older baselines timed the lighter normalize_text
+    results["stage.clean_text"] = measure(per_text(clean_text), repeat)
+    results["stage.vectorize.sklearn"] = measure(per_text(lambda t: vectorizer.transform([t])), repeat)
+    results["stage.vectorize.fused"] = measure(per_text(scorer.features), repeat)
+
+    sparse_rows = [vectorizer.transform([t]) for t in sample]
+    fused_rows = [[scorer.features(t)] for t in sample]
+    results["stage.predict_proba.sklearn"] = measure(lambda: [model.predict_proba(x) for x in sparse_rows], repeat)
+    results["stage.predict_proba.fused"] = measure(lambda: [scorer.predict_proba_features(r) for r in fused_rows], repeat)
+
+    probabilities = [model.predict_proba(x) for x in sparse_rows]
+    results["stage.decode.inverse_transform"] = measure(
+        lambda: [label_encoder.inverse_transform(np.argmax(p, axis=1)) for p in probabilities], repeat)
+    results["stage.decode.format_prediction"] = measure(
+        lambda: [app.format_prediction(app.emotion_labels, p[0]) for p in probabilities], repeat)
+
+    payloads = [app.format_prediction(app.emotion_labels, p[0]) for p in probabilities]
+    results["stage.serialize.json"] = measure(lambda: [json.dumps(p) for p in payloads], repeat)
+    with app.app.app_context():
+        results["stage.serialize.jsonify"] = measure(lambda: [jsonify(p) for p in payloads], repeat)
+
+    # Stage numbers above are for 200 texts; report per text
+    for result in results.values():
+        for key in ("median_us", "p90_us", "mean_us"):
+            result[key] /= len(sample)
+    return results
+
+
+# Inputs the corpus does not cover: URLs, digits, punctuation, non-ASCII
+# letters and whitespace, case folding that changes length, non-strings
+PARITY_EDGE_CASES = [
+    "", "   ", "Hello  WORLD!!", "see http://x.com/a?b now", "httpfoo bar",
+    "DON'T 123 stop", "naïve café", "İstanbul ẞ ﬁ", "tab\there\x0bvt\x1cfs",
+    "nbsp\u00a0sep\u2028line", "emoji 😂 ok", float("nan"), 12,
+]
+
+
+def check_clean_parity(texts):
+    # The fast cleaners must return exactly what the original train_model.py
+    # regex chain returned, or serving no longer matches training
+    import pandas as pd
+    from preprocessing import clean_series, clean_texts, reference_clean_text
+
+    expected = [reference_clean_text(t) for t in texts]
+    mismatches = [t for t, e, c in zip(texts, expected, clean_texts(texts)) if e != c]
+    mismatches += [t for t, e, c in zip(texts, expected, clean_series(pd.Series(texts, dtype=object))) if e != c]
+    if mismatches:
+        raise AssertionError(f"clean_text differs from the training cleaner for {mismatches[:5]!r}")
+    return len(texts)
+
+
+def bench_preprocess(texts, repeat):
+    import pandas as pd
+    from preprocessing import clean_series, clean_texts, reference_clean_text
+
+    checked = check_clean_parity(texts + PARITY_EDGE_CASES)
+    print(f"✅ clean_text parity with the training cleaner on {checked} texts")
+
+    batch = cycle(texts, 20000)
+    series = pd.Series(batch)
+    rounds = max(3, repeat // 5)
+    results = {}
+    for name, fn in (
+        ("reference", lambda: [reference_clean_text(t) for t in batch]),
+        ("clean_texts", lambda: clean_texts(batch)),
+        ("clean_series", lambda: clean_series(series)),
+    ):
+        result = measure(fn, rounds)
+        result["rows_per_second"] = len(batch) / (result["median_us"] / 1e6)
+        for key in ("median_us", "p90_us", "mean_us"):
+            result[key] /= len(batch)
+        results[f"preprocess.{name}"] = result
+    return results
+
+
+def bench_endpoint(texts, repeat):
+    import app
+
+    client = app.app.test_client()
+    sample = texts[:200]
+    call = lambda: [client.post("/predict", json={"text": t}) for t in sample]
+    result = measure(call, repeat)
+    for key in ("median_us", "p90_us", "mean_us"):
+        result[key] /= len(sample)
+    return {"endpoint.predict": result}
+
+
+def check_inference_parity(scorer, vectorizer, model, label_encoder, texts):
+    # The fused scorer must reproduce vectorizer.transform, predict_proba and
+    # the label decoding exactly, for single texts and every batch path
+    for size in (1, 10, 100, 1000, len(texts)):
+        batch = texts[:size]
+        X = vectorizer.transform(batch)
+        dense = np.zeros(X.shape)
+        for i, (columns, values) in enumerate(scorer.transform(batch)):
+            dense[i, columns] = values
+        if not np.array_equal(dense, X.toarray()):
+            raise AssertionError(f"fused transform differs from vectorizer.transform for {size} texts")
+
+        expected = model.predict_proba(X)
+        if not np.array_equal(scorer.predict_proba(batch), expected):
+            raise AssertionError(f"fused predict_proba differs from sklearn for {size} texts")
+        best = expected.argmax(axis=1)
+        if list(scorer.inverse_transform(best)) != list(label_encoder.inverse_transform(model.classes_[best])):
+            raise AssertionError(f"fused labels differ from label_encoder.inverse_transform for {size} texts")
+    return len(texts)
+
+
+def bench_batch(texts, repeat, sizes=BATCH_SIZES):
+    import app
+
+    model = pickle.load(open("emotion_model.pkl", "rb"))
+    vectorizer = pickle.load(open("vectorizer.pkl", "rb"))
+    label_encoder = pickle.load(open("label_encoder.pkl", "rb"))
+    scorer = app.scorer
+
+    checked = check_inference_parity(scorer, vectorizer, model, label_encoder, cycle(texts, 2000))
+    print(f"✅ Fused scorer matches sklearn exactly on {checked} texts")
+
+    results = {}
+    for size in sizes:
+        batch = cycle(texts, size)
+        rounds = max(3, min(repeat, 20000 // size))
+        for engine, fn in (
+            ("sklearn", lambda: model.predict_proba(vectorizer.transform(batch))),
+            ("fused", lambda: scorer.predict_proba(batch)),
+        ):
+            result = measure(fn, rounds)
+            result["texts_per_second"] = size / (result["median_us"] / 1e6)
+            results[f"batch.{engine}.{size}"] = result
+    return results
+
+
+def available_backends():
+    import app
+    from backends import NaiveBayesBackend, TransformerBackend
+    from preprocessing import clean_texts
+
+    model = pickle.load(open("emotion_model.pkl", "rb"))
+    vectorizer = pickle.load(open("vectorizer.pkl", "rb"))
+    backends = {
+        "nb.fused": NaiveBayesBackend(app.emotion_labels, app.model_version, scorer=app.scorer),
+        "nb.sklearn": NaiveBayesBackend(app.emotion_labels, app.model_version, model=model, vectorizer=vectorizer),
+    }
+    try:
+        backends["transformer"] = TransformerBackend.from_env(labels=app.emotion_labels)
+    except (ImportError, OSError, ValueError) as e:
+        print(f"⚠️ Transformer backend skipped: {e}")
+
+    # Each backend gets its inputs the way app.py would pass them
+    return {
+        name: (backend, clean_texts if backend.clean_input else list)
+        for name, backend in backends.items()
+    }
+
+
+def bench_backends(texts, repeat):
+    results = {}
+    single = texts[:100]
+    batch = cycle(texts, BACKEND_BATCH_SIZE)
+    for name, (backend, prepare_input) in available_backends().items():
+        single_input = prepare_input(single)
+        result = measure(lambda: [backend.predict_proba([t]) for t in single_input], max(3, repeat // 5))
+        for key in ("median_us", "p90_us", "mean_us"):
+            result[key] /= len(single_input)
+        results[f"backends.{name}.single"] = result
+
+        batch_input = prepare_input(batch)
+        result = measure(lambda: backend.predict_proba(batch_input), max(3, repeat // 5))
+        result["texts_per_second"] = len(batch) / (result["median_us"] / 1e6)
+        results[f"backends.{name}.batch{BACKEND_BATCH_SIZE}"] = result
+    return results
+
+
+COLD_START = """
+import time
+started = time.perf_counter()
+import app
+client = app.app.test_client()
+response = client.post("/predict", json={"text": "i am so happy today"})
+assert response.status_code == 200, response.get_json()
+print((time.perf_counter() - started) * 1e6)
+"""
+
+
+def bench_coldstart(repeat):
+    results = {}
+    for engine in ("fused", "sklearn"):
+        env = dict(os.environ, INFERENCE_ENGINE=engine, FIREBASE_INIT_ATTEMPTS="1")
+        samples = []
+        for _ in range(max(3, repeat // 10)):
+            out = subprocess.run(
+                [sys.executable, "-c", COLD_START], env=env,
+                capture_output=True, text=True, check=True,
+            )
+            samples.append(float(out.stdout.strip().splitlines()[-1]))
+        samples.sort()
+        results[f"coldstart.{engine}"] = {
+            "median_us": statistics.median(samples),
+            "p90_us": samples[int(0.9 * (len(samples) - 1))],
+            "mean_us": statistics.fmean(samples),
+            "samples": len(samples),
+        }
+    return results
+
+
+# Modules the fused engine should not need to import
+HEAVY_MODULES = ("sklearn", "scipy", "pandas")
+
+
+def bench_imports(repeat):
+    # Cumulative `python -X importtime` of app.py (which also loads the
+    # model) and of the heavy modules it pulled in, per engine
+    results = {}
+    for engine in ("fused", "sklearn"):
+        env = dict(os.environ, INFERENCE_ENGINE=engine, FIREBASE_INIT_ATTEMPTS="1")
+        samples = {name: [] for name in ("app",) + HEAVY_MODULES}
+        for _ in range(max(3, repeat // 10)):
+            out = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", "import app"], env=env,
+                capture_output=True, text=True, check=True,
+            )
+            seen = {}
+            for line in out.stderr.splitlines():
+                if line.startswith("import time:") and line.count("|") == 2:
+                    _, cumulative, name = line[len("import time:"):].split("|")
+                    if cumulative.strip().isdigit():
+                        seen.setdefault(name.strip(), int(cumulative))
+            for name in samples:
+                samples[name].append(seen.get(name, 0))
+
+        for name, values in samples.items():
+            values.sort()
+            results[f"imports.{engine}.{name}"] = {
+                "median_us": statistics.median(values),
+                "p90_us": values[int(0.9 * (len(values) - 1))],
+                "mean_us": statistics.fmean(values),
+                "samples": len(values),
+            }
+        loaded = [name for name in HEAVY_MODULES if statistics.median(samples[name]) > 0]
+        print(f"📦 INFERENCE_ENGINE={engine} imports {', '.join(loaded) or 'none of ' + '/'.join(HEAVY_MODULES)}")
+    return results
+
+
+def environment():
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    try:
+        info["commit"] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        pass
+    return info
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    print(f"\n{'benchmark':<36}{'baseline us':>14}{'current us':>14}{'change':>9}")
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        before, after = baseline[name]["median_us"], results[name]["median_us"]
+        change = (after - before) / before
+        flag = ""
+        if change > tolerance:
+            flag = "  ⚠️ REGRESSION"
+            regressions.append(name)
+        print(f"{name:<36}{before:>14.1f}{after:>14.1f}{change:>+8.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the emotion inference hot path")
+    parser.add_argument("--suite", choices=SUITES, action="append",
+                        help="suite to run (repeatable, default: all)")
+    parser.add_argument("--repeat", type=int, default=30, help="samples per benchmark")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="allowed slowdown before flagging a regression (default 0.15)")
+    args = parser.parse_args()
+
+    texts = load_corpus()
+    results = {}
+    for suite in args.suite or SUITES:
+        print(f"⏱️ Running {suite} benchmarks...")
+        if suite == "stages":
+            results.update(bench_stages(texts, args.repeat))
+        elif suite == "preprocess":
+            results.update(bench_preprocess(texts, args.repeat))
+        elif suite == "endpoint":
+            results.update(bench_endpoint(texts, args.repeat))
+        elif suite == "batch":
+            results.update(bench_batch(texts, args.repeat))
+        elif suite == "backends":
+            results.update(bench_backends(texts, args.repeat))
+        elif suite == "coldstart":
+            results.update(bench_coldstart(args.repeat))
+        elif suite == "imports":
+            results.update(bench_imports(args.repeat))
+
+    print(f"\n{'benchmark':<36}{'median us':>12}{'p90 us':>12}{'per second':>14}")
+    for name, result in sorted(results.items()):
+        rate = result.get("rows_per_second", result.get("texts_per_second"))
+        rate = f"{rate:>14,.0f}" if rate else ""
+        print(f"{name:<36}{result['median_us']:>12.1f}{result['p90_us']:>12.1f}{rate}")
+
+    report = {"environment": environment(), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            sys.exit(1)
+        print("\n✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
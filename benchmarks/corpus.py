@@ -0,0 +1,68 @@
+import os
+import random
+
+# ------------------------------------------------------------
+# 🔹 Synthetic Benchmark Corpus
+# ------------------------------------------------------------
+# Deterministic Reddit/app-style messages with a realistic length mix:
+# mostly short phrases, some medium comments and a tail of long ones, with
+# capitals, punctuation, URLs and emoji the cleaning step has to handle.
+# The generated file is committed so every run measures the same inputs;
+# regenerate it with:  python -m benchmarks.corpus
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "synthetic_corpus.txt")
+
+WORDS = """
+i you we they he she it this that my your our so very really just not
+am is are was be been feel feeling felt think know love hate like want
+need hope wish miss thank thanks sorry please wow omg lol yeah no yes
+happy sad angry mad upset scared afraid nervous anxious excited proud
+grateful relieved disappointed annoyed confused curious surprised shocked
+amazing awesome great good bad terrible awful horrible wonderful beautiful
+funny hilarious weird strange boring stupid cute sweet kind nice rude
+day today tomorrow yesterday night morning week life time people friend
+friends family mom dad game movie song job work school exam team news
+about with for from what why how when where who all some more much too
+can cant dont wont didnt really never always again still even ever
+lost won finally actually literally honestly totally seriously
+the a an and but or if because then than to of in on at by up out
+""".split()
+
+ENDINGS = ["", "", "", ".", "!", "!!", "?", "...", " :)", " 😂", " ❤️", " 😭"]
+EXTRAS = ["http://example.com/post/123", "[NAME]", "2024", "#blessed", "@user"]
+
+
+def random_text(rng):
+    bucket = rng.random()
+    if bucket < 0.5:
+        length = rng.randint(2, 8)
+    elif bucket < 0.85:
+        length = rng.randint(9, 30)
+    else:
+        length = rng.randint(31, 120)
+
+    words = []
+    for _ in range(length):
+        if rng.random() < 0.03:
+            words.append(rng.choice(EXTRAS))
+        else:
+            word = rng.choice(WORDS)
+            words.append(word.capitalize() if rng.random() < 0.1 else word)
+    return " ".join(words) + rng.choice(ENDINGS)
+
+
+def generate_corpus(n=2000, seed=42):
+    rng = random.Random(seed)
+    return [random_text(rng) for _ in range(n)]
+
+
+def load_corpus():
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+if __name__ == "__main__":
+    texts = generate_corpus()
+    with open(CORPUS_PATH, "w", encoding="utf-8") as f:
+        f.write("\n".join(texts) + "\n")
+    print(f"✅ Wrote {len(texts)} texts to {CORPUS_PATH}")
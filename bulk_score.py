@@ -0,0 +1,342 @@
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import thread_budget
+from inference import FusedScorer
+from model_bundle import load_bundle
+from model_registry import ModelRegistry
+from preprocessing import clean_texts
+
+# ------------------------------------------------------------
+# 🔹 Offline Bulk Scoring
+# ------------------------------------------------------------
+# Usage:
+#     python bulk_score.py messages.parquet scored/ --top-k 3
+#     python bulk_score.py archive.ndjson.gz scored/ --text-column body --id-column message_id --workers 8
+#
+# Scores a CSV, Parquet or NDJSON file (CSV and NDJSON may be gzipped)
+# with the Naive Bayes bundle, for backfills that should not go through
+# the HTTP service:
+# 1. The input is read through pyarrow's streaming readers and cut into
+#    batches of exactly --batch-size rows, so batch i always holds the
+#    same rows, whatever block sizes the reader produced.
+# 2. Batches go to a pool of --workers processes. Each worker loads the
+#    bundle once (load_bundle); the weights are memory-mapped, so all
+#    workers share one page-cache copy. At most 2 x workers batches are in
+#    flight, so the reader never runs far ahead of the scorers.
+# 3. A worker cleans and scores its batch and writes it to
+#    <output>/part-<batch>.parquet itself (temp file + rename), so results
+#    never travel back through this process. Columns: id (the --id-column,
+#    or the row number), emotion, confidence and, with --top-k,
+#    top: list<struct<emotion, confidence>>. Null texts get null results.
+# 4. A rerun skips every batch whose part file exists, which resumes an
+#    interrupted job from where it stopped. <output>/_job.json records the
+#    input, columns, batch size, top-k and model version; a rerun with
+#    different ones is refused unless --overwrite starts over.
+# The output directory is a Parquet dataset: pd.read_parquet(output) or
+# pyarrow.dataset.dataset(output) (files starting with "_" or "." are
+# skipped by both). Every worker gets one BLAS/OpenMP thread and, with
+# --pin, its own CPU, so throughput grows with --workers up to the number
+# of cores; the report shows how busy the workers were.
+
+FORMATS = ("csv", "parquet", "ndjson")
+EXTENSIONS = {".csv": "csv", ".parquet": "parquet", ".pq": "parquet",
+              ".ndjson": "ndjson", ".jsonl": "ndjson", ".json": "ndjson"}
+BATCH_SIZE = 8192
+READ_BLOCK_BYTES = 4 << 20
+JOB_FILE = "_job.json"
+PROGRESS_SECONDS = 10.0
+
+
+def default_bundle():
+    # Same choice as app.py: the registry's ACTIVE version, else MODEL_BUNDLE
+    registry = ModelRegistry(os.environ.get("MODEL_REGISTRY", "model_registry"))
+    version = registry.active() if registry.exists() else None
+    return registry.path(version) if version else os.environ.get("MODEL_BUNDLE", "model_bundle")
+
+
+def detect_format(path):
+    name = path[:-3] if path.endswith(".gz") else path
+    extension = os.path.splitext(name)[1].lower()
+    if extension not in EXTENSIONS:
+        raise SystemExit(f"❌ Cannot tell the format of {path}; pass --format {'|'.join(FORMATS)}")
+    return EXTENSIONS[extension]
+
+
+# ------------------------------------------------------------
+# 🔹 Reading
+# ------------------------------------------------------------
+def read_batches(path, fmt, columns):
+    # Record batches holding (at least) `columns`, in file order
+    if fmt == "parquet":
+        yield from pq.ParquetFile(path).iter_batches(batch_size=BATCH_SIZE, columns=columns)
+    elif fmt == "csv":
+        from pyarrow import csv
+        try:
+            reader = csv.open_csv(
+                path,
+                read_options=csv.ReadOptions(block_size=READ_BLOCK_BYTES),
+                convert_options=csv.ConvertOptions(include_columns=columns),
+            )
+        except KeyError as e:
+            raise SystemExit(f"❌ {e.args[0] if e.args else e}")
+        yield from reader
+    else:
+        from pyarrow import json as pa_json
+        reader = pa_json.open_json(path, read_options=pa_json.ReadOptions(block_size=READ_BLOCK_BYTES))
+        yield from reader
+
+
+def fixed_batches(batches, size):
+    # Re-cut a stream of record batches into batches of exactly `size`
+    # rows (the last one may be shorter)
+    pending, rows = [], 0
+    for batch in batches:
+        while batch.num_rows:
+            take = min(size - rows, batch.num_rows)
+            pending.append(batch.slice(0, take))
+            batch = batch.slice(take)
+            rows += take
+            if rows == size:
+                yield pa.Table.from_batches(pending).combine_chunks().to_batches()[0]
+                pending, rows = [], 0
+    if rows:
+        yield pa.Table.from_batches(pending).combine_chunks().to_batches()[0]
+
+
+def input_columns(batch, text_column, id_column):
+    missing = [c for c in (text_column, id_column) if c and c not in batch.schema.names]
+    if missing:
+        raise SystemExit(f"❌ Column(s) {', '.join(missing)} not in the input (has: {', '.join(batch.schema.names)})")
+    text = batch.column(text_column)
+    if not pa.types.is_string(text.type) and not pa.types.is_large_string(text.type):
+        text = text.cast(pa.string())
+    return text, batch.column(id_column) if id_column else None
+
+
+# ------------------------------------------------------------
+# 🔹 Worker
+# ------------------------------------------------------------
+worker = None
+
+
+def init_worker(bundle_path, output, top_k, slots=None, workers=1):
+    global worker
+    # Ctrl+C goes to the whole process group: the parent stops submitting
+    # and the batches already running finish writing their parts
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if slots is not None:
+        os.sched_setaffinity(0, thread_budget.cpu_slice(slots.get(), workers))
+    bundle = load_bundle(bundle_path)
+    scorer = FusedScorer.from_bundle(bundle)
+    worker = {
+        "scorer": scorer,
+        "labels": np.asarray(scorer.classes, dtype=object),
+        "version": bundle.version,
+        "output": output,
+        "top_k": top_k,
+    }
+
+
+def part_path(output, index):
+    return os.path.join(output, f"part-{index:06d}.parquet")
+
+
+def result_table(proba, labels, ids, valid, top_k):
+    best = proba.argmax(axis=1)
+    mask = ~valid
+    columns = {
+        "id": ids,
+        "emotion": pa.DictionaryArray.from_arrays(
+            pa.array(best.astype(np.int32), mask=mask), pa.array(labels.tolist(), pa.string())),
+        "confidence": pa.array(proba[np.arange(len(best)), best], mask=mask),
+    }
+    if top_k:
+        # Null rows must be empty lists for the Parquet writer
+        k = min(top_k, proba.shape[1])
+        order = np.argsort(-proba[valid], axis=1, kind="stable")[:, :k]
+        entries = pa.StructArray.from_arrays(
+            [pa.array(labels[order].ravel().tolist(), pa.string()),
+             pa.array(np.take_along_axis(proba[valid], order, axis=1).ravel())],
+            names=["emotion", "confidence"],
+        )
+        offsets = np.zeros(len(best) + 1, dtype=np.int32)
+        np.cumsum(valid * k, out=offsets[1:])
+        columns["top"] = pa.ListArray.from_arrays(pa.array(offsets), entries, mask=pa.array(mask))
+    return pa.table(columns)
+
+
+def score_batch(index, first_row, text, ids):
+    # Score one batch and write its part file -> (index, rows, seconds)
+    started = time.perf_counter()
+    valid = text.is_valid().to_numpy(zero_copy_only=False)
+    texts = clean_texts(text.fill_null("").to_pylist())
+    proba = worker["scorer"].predict_proba(texts)
+    if ids is None:
+        ids = pa.array(np.arange(first_row, first_row + len(texts), dtype=np.int64))
+
+    table = result_table(proba, worker["labels"], ids, valid, worker["top_k"])
+    table = table.replace_schema_metadata({"model_version": worker["version"]})
+    path = part_path(worker["output"], index)
+    temp = os.path.join(worker["output"], f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    pq.write_table(table, temp)
+    os.replace(temp, path)
+    return index, len(texts), time.perf_counter() - started
+
+
+# ------------------------------------------------------------
+# 🔹 Job
+# ------------------------------------------------------------
+def job_settings(args, fmt, model_version):
+    stat = os.stat(args.input)
+    return {
+        "input": os.path.abspath(args.input),
+        "input_bytes": stat.st_size,
+        "input_mtime_ns": stat.st_mtime_ns,
+        "format": fmt,
+        "text_column": args.text_column,
+        "id_column": args.id_column,
+        "batch_size": args.batch_size,
+        "top_k": args.top_k,
+        "model_version": model_version,
+    }
+
+
+def prepare_output(output, settings, overwrite):
+    # -> indices of the batches already written by an earlier run
+    job_path = os.path.join(output, JOB_FILE)
+    changed = []
+    if os.path.exists(job_path):
+        with open(job_path) as f:
+            previous = json.load(f)
+        changed = [k for k, v in settings.items() if previous.get(k) != v]
+        if changed and not overwrite:
+            raise SystemExit(f"❌ {output} holds a job with different {', '.join(changed)}; "
+                             f"use another output directory or --overwrite")
+    os.makedirs(output, exist_ok=True)
+    for name in os.listdir(output):
+        # Temp files of batches that were being written when a run stopped
+        if name.startswith(".part-") or (changed and name.startswith("part-")):
+            os.remove(os.path.join(output, name))
+    with open(job_path, "w") as f:
+        json.dump(settings, f, indent=2)
+    return {
+        int(name[5:-8]) for name in os.listdir(output)
+        if name.startswith("part-") and name.endswith(".parquet")
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a CSV, Parquet or NDJSON file into a Parquet dataset")
+    parser.add_argument("input")
+    parser.add_argument("output", help="output directory (Parquet dataset)")
+    parser.add_argument("--format", choices=FORMATS, help="input format (default: from the file extension)")
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--id-column", help="copied to the output as id (default: the row number)")
+    parser.add_argument("--top-k", type=int, default=0, help="also write the k most likely emotions per row")
+    parser.add_argument("--bundle", default=default_bundle(), help="model bundle directory")
+    parser.add_argument("--workers", type=int, default=len(thread_budget.available_cpus()))
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows per batch and part file")
+    parser.add_argument("--pin", action="store_true", help="pin every worker to its own CPU(s)")
+    parser.add_argument("--overwrite", action="store_true", help="discard the output of a different earlier job")
+    parser.add_argument("--report", help="write the throughput report as JSON")
+    args = parser.parse_args()
+
+    fmt = args.format or detect_format(args.input)
+    model_version = load_bundle(args.bundle).version
+    done = prepare_output(args.output, job_settings(args, fmt, model_version), args.overwrite)
+    columns = [c for c in (args.text_column, args.id_column) if c]
+
+    # Set before the workers start so their BLAS/OpenMP pools open with one
+    # thread; the pool uses "spawn" because forking after pyarrow has
+    # started its own threads is unsafe
+    thread_budget.set_thread_env(1)
+    context = multiprocessing.get_context("spawn")
+    slots = None
+    if args.pin:
+        slots = context.Queue()
+        for slot in range(args.workers):
+            slots.put(slot)
+
+    print(f"⏱️ Scoring {args.input} ({fmt}) with model {model_version} on {args.workers} workers"
+          + (f", resuming after {len(done)} finished batches" if done else ""))
+    started = last_progress = time.perf_counter()
+    rows = skipped_rows = busy = 0
+    scored_batches = 0
+    in_flight = set()
+    interrupted = False
+
+    def collect(return_when):
+        nonlocal rows, busy, scored_batches, in_flight
+        finished, in_flight = wait(in_flight, return_when=return_when)
+        for future in finished:
+            _, batch_rows, seconds = future.result()
+            rows += batch_rows
+            busy += seconds
+            scored_batches += 1
+
+    with ProcessPoolExecutor(args.workers, mp_context=context, initializer=init_worker,
+                             initargs=(args.bundle, args.output, args.top_k, slots, args.workers)) as pool:
+        try:
+            first_row = 0
+            batches = fixed_batches(read_batches(args.input, fmt, columns), args.batch_size)
+            for index, batch in enumerate(batches):
+                if index in done:
+                    skipped_rows += batch.num_rows
+                else:
+                    text, ids = input_columns(batch, args.text_column, args.id_column)
+                    in_flight.add(pool.submit(score_batch, index, first_row, text, ids))
+                    if len(in_flight) >= 2 * args.workers:
+                        collect(FIRST_COMPLETED)
+                first_row += batch.num_rows
+
+                now = time.perf_counter()
+                if now - last_progress >= PROGRESS_SECONDS:
+                    last_progress = now
+                    print(f"⏳ {rows:,} rows scored, {rows / (now - started):,.0f} rows/s")
+        except KeyboardInterrupt:
+            interrupted = True
+            in_flight = {future for future in in_flight if not future.cancel()}
+            print("\n⚠️ Interrupted; finishing the running batches (rerun the same command to resume)")
+        collect(ALL_COMPLETED)
+
+    elapsed = time.perf_counter() - started
+    report = {
+        "input": args.input,
+        "output": args.output,
+        "model_version": model_version,
+        "workers": args.workers,
+        "batch_size": args.batch_size,
+        "rows_scored": rows,
+        "batches_scored": scored_batches,
+        "rows_skipped": skipped_rows,
+        "batches_skipped": len(done),
+        "seconds": elapsed,
+        "rows_per_second": rows / elapsed if elapsed else 0.0,
+        # Share of the wall time the workers spent scoring; well below 1
+        # means they waited on reading (this process) rather than on CPU
+        "worker_utilization": busy / (elapsed * args.workers) if elapsed else 0.0,
+        "complete": not interrupted,
+    }
+    print(f"{'⚠️' if interrupted else '✅'} Scored {rows:,} rows in {scored_batches} batches "
+          f"({len(done)} batches already done) in {elapsed:.1f}s: {report['rows_per_second']:,.0f} rows/s, "
+          f"workers {report['worker_utilization']:.0%} busy")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report written to {args.report}")
+    if interrupted:
+        raise SystemExit(130)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import argparse
+import json
+import os
+import pickle
+import shutil
+import time
+import numpy as np
+
+from inference import FusedScorer
+from model_bundle import COMPACT_DTYPES, WEIGHTS_FILE, export_compact_bundle, load_bundle, term_spread
+from stage_cache import StageCache
+from train_model import prepare_data
+
+# ------------------------------------------------------------
+# 🔹 Compact Model Export
+# ------------------------------------------------------------
+# Usage:
+#     python compact_model.py --dtype int8 --output model_bundle_compact
+#     python compact_model.py --dtype float32 --min-spread 0.3 --sweep
+#
+# emotion_model.pkl carries everything MultinomialNB keeps for training
+# (feature_count_, class_count_, ...) next to the float64 weights. The
+# compact bundle keeps only what scoring reads, with the weights as
+# float32 or int8 (per-class scale and offset), and drops the weights of
+# terms whose log-probability varies less than --min-spread nats across
+# classes. Serve it with MODEL_BUNDLE=<output> (or publish it to the
+# model registry); FusedScorer.from_bundle picks the compact scorer.
+#
+# The report compares it with the full-precision model on --sample texts
+# of the cleaned training data: artifact size, scoring time (one text per
+# call and 1000-text batches) and how often the top emotion differs.
+# --sweep repeats the comparison for a range of --min-spread values.
+
+SAMPLE_SIZE = 20000
+SWEEP_SPREADS = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+
+
+def single_text_us(scorer, texts, n=500):
+    timings = []
+    for text in texts[:n]:
+        started = time.perf_counter()
+        scorer.predict_proba([text])
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings) * 1e6)
+
+
+def batch_us_per_text(scorer, texts, batch_size=1000):
+    batch = texts[:batch_size]
+    started = time.perf_counter()
+    scorer.predict_proba(batch)
+    return (time.perf_counter() - started) / len(batch) * 1e6
+
+
+def weight_bytes(bundle):
+    # Bytes of the scoring weights (excluding vocabulary and idf)
+    names = ("feature_log_prob_t", "class_log_prior", "weights", "weight_rows", "weight_scale", "weight_offset")
+    return sum(bundle.arrays[name].nbytes for name in names if name in bundle.arrays)
+
+
+def compare(full, compact, texts):
+    full_proba = full.predict_proba(texts)
+    compact_proba = compact.predict_proba(texts)
+    return {
+        "disagreement_rate": float((full_proba.argmax(axis=1) != compact_proba.argmax(axis=1)).mean()),
+        "max_abs_proba_diff": float(np.abs(full_proba - compact_proba).max()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a quantized, pruned serving bundle")
+    parser.add_argument("--dtype", choices=COMPACT_DTYPES, default="int8")
+    parser.add_argument("--min-spread", type=float, default=0.0,
+                        help="drop terms whose log-probability std across classes is below this (nats)")
+    parser.add_argument("--output", default="model_bundle_compact")
+    parser.add_argument("--full-bundle", default="model_bundle", help="full-precision bundle to compare with")
+    parser.add_argument("--data", default="go_emotions_dataset.csv")
+    parser.add_argument("--cache-dir", default=".train_cache")
+    parser.add_argument("--sample", type=int, default=SAMPLE_SIZE, help="texts used for the report")
+    parser.add_argument("--sweep", action="store_true", help="also report a range of --min-spread values")
+    parser.add_argument("--report", help="write the report as JSON")
+    args = parser.parse_args()
+
+    model = pickle.load(open("emotion_model.pkl", "rb"))
+    vectorizer = pickle.load(open("vectorizer.pkl", "rb"))
+    label_encoder = pickle.load(open("label_encoder.pkl", "rb"))
+
+    manifest = export_compact_bundle(
+        vectorizer, model, label_encoder, args.output, dtype=args.dtype, min_spread=args.min_spread)
+    print(f"✅ Compact bundle {manifest['version']} ({args.dtype}, "
+          f"{manifest['weights']['pruned_terms']} of {manifest['n_features']} terms pruned) in {args.output}/")
+
+    data, _ = prepare_data(args.data, StageCache(args.cache_dir))
+    texts = data["text"].sample(min(args.sample, len(data)), random_state=0).tolist()
+
+    full_bundle, compact_bundle = load_bundle(args.full_bundle), load_bundle(args.output)
+    full, compact = FusedScorer.from_bundle(full_bundle), FusedScorer.from_bundle(compact_bundle)
+
+    report = {
+        "dtype": args.dtype,
+        "min_spread": args.min_spread,
+        "pruned_terms": manifest["weights"]["pruned_terms"],
+        "model_pickle_bytes": os.path.getsize("emotion_model.pkl"),
+        "full_bundle_bytes": os.path.getsize(os.path.join(args.full_bundle, WEIGHTS_FILE)),
+        "compact_bundle_bytes": os.path.getsize(os.path.join(args.output, WEIGHTS_FILE)),
+        "full_weight_bytes": weight_bytes(full_bundle),
+        "compact_weight_bytes": weight_bytes(compact_bundle),
+        "full_single_us": single_text_us(full, texts),
+        "compact_single_us": single_text_us(compact, texts),
+        "full_batch_us_per_text": batch_us_per_text(full, texts),
+        "compact_batch_us_per_text": batch_us_per_text(compact, texts),
+        **compare(full, compact, texts),
+    }
+
+    print(f"\n📦 Size        pickle {report['model_pickle_bytes'] / 1024:,.0f} KB   "
+          f"bundle {report['full_bundle_bytes'] / 1024:,.0f} KB -> {report['compact_bundle_bytes'] / 1024:,.0f} KB   "
+          f"weights {report['full_weight_bytes'] / 1024:,.0f} KB -> {report['compact_weight_bytes'] / 1024:,.0f} KB "
+          f"({report['full_weight_bytes'] / report['compact_weight_bytes']:.1f}x smaller)")
+    print(f"⏱️ Single text {report['full_single_us']:.1f} -> {report['compact_single_us']:.1f} us "
+          f"({report['full_single_us'] / report['compact_single_us']:.2f}x)")
+    print(f"⏱️ Batch 1000  {report['full_batch_us_per_text']:.1f} -> {report['compact_batch_us_per_text']:.1f} us/text "
+          f"({report['full_batch_us_per_text'] / report['compact_batch_us_per_text']:.2f}x)")
+    print(f"🎯 Top emotion differs on {report['disagreement_rate']:.2%} of {len(texts)} texts "
+          f"(max probability difference {report['max_abs_proba_diff']:.4f})")
+
+    if args.sweep:
+        spread = term_spread(model)
+        sweep_dir = args.output + ".sweep"
+        print(f"\n{'min_spread':>10}{'pruned':>8}{'weights KB':>12}{'disagree':>10}")
+        report["sweep"] = []
+        for min_spread in SWEEP_SPREADS:
+            export_compact_bundle(vectorizer, model, label_encoder, sweep_dir,
+                                  dtype=args.dtype, min_spread=min_spread)
+            bundle = load_bundle(sweep_dir)
+            row = {"min_spread": min_spread, "pruned_terms": int((spread < min_spread).sum()),
+                   "weight_bytes": weight_bytes(bundle),
+                   **compare(full, FusedScorer.from_bundle(bundle), texts)}
+            report["sweep"].append(row)
+            print(f"{min_spread:>10.2f}{row['pruned_terms']:>8}{row['weight_bytes'] / 1024:>12,.0f}"
+                  f"{row['disagreement_rate']:>10.2%}")
+        shutil.rmtree(sweep_dir)
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
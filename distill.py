@@ -0,0 +1,216 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from sklearn.naive_bayes import MultinomialNB
+from sklearn.preprocessing import LabelEncoder
+
+from backends import TransformerBackend
+from evaluate import holdout_split
+from inference import FusedScorer
+from preprocessing import clean_texts
+from stage_cache import StageCache, file_digest
+from train_model import ALPHA, extract_labels, make_vectorizer, read_dataset, save_artifacts, train
+
+# ------------------------------------------------------------
+# 🔹 Distillation: transformer teacher -> TF-IDF + NB student
+# ------------------------------------------------------------
+# Usage:
+#     python distill.py --corpus unlabelled.csv               (text column)
+#     python distill.py --corpus go_emotions_dataset.csv --labelled --labels soft
+#
+# 1. The teacher (the transformer backend, TRANSFORMER_MODEL_DIR) scores
+#    the corpus in chunks of --chunk-size texts. Each chunk's probabilities
+#    are saved to .train_cache/teacher-<key>/ as soon as it is done, keyed
+#    by the corpus content and the teacher version, so an interrupted run
+#    resumes and a rerun with other student settings scores nothing.
+# 2. The student is the usual TfidfVectorizer + MultinomialNB, fitted on
+#    the cleaned texts of the training split with either
+#      hard labels  the teacher's argmax, or
+#      soft labels  the teacher's full distribution: every text counts
+#                   towards each class with weight p(class), which is
+#                   what fitting on one weighted copy per class computes;
+#                   done as one partial_fit per class per chunk, so no
+#                   expanded matrix is built
+# 3. On the held-out split it reports student / teacher agreement and,
+#    with --labelled, accuracy against the true labels together with a
+#    NB trained on those labels directly, i.e. how much of the teacher's
+#    gain over plain NB the student recovers. Student latency is timed
+#    with the fused scorer app.py serves.
+# 4. Unless --no-save, the student is written as emotion_model.pkl,
+#    vectorizer.pkl, label_encoder.pkl and model_bundle/, the same
+#    artifacts train_model.py writes.
+
+CHUNK_SIZE = 512
+HOLDOUT_FRACTION = 0.2
+
+
+def load_corpus(path, labelled, text_column="text"):
+    # Raw texts and, for a corpus in the training format, their labels
+    if labelled:
+        data = extract_labels(read_dataset(path))
+        return data["text"].astype(str).tolist(), data["emotion"].to_numpy()
+    data = pd.read_csv(path, usecols=[text_column]).dropna()
+    return data[text_column].astype(str).tolist(), None
+
+
+def teacher_probabilities(teacher, texts, directory, chunk_size=CHUNK_SIZE):
+    # Probabilities for every text, one cached .npy file per chunk
+    os.makedirs(directory, exist_ok=True)
+    n_chunks = (len(texts) + chunk_size - 1) // chunk_size
+    chunks, scored, started = [], 0, time.perf_counter()
+    for i in range(n_chunks):
+        path = os.path.join(directory, f"chunk-{i:06d}.npy")
+        if os.path.exists(path):
+            chunks.append(np.load(path))
+            continue
+
+        rows = teacher.predict_proba(texts[i * chunk_size:(i + 1) * chunk_size]).astype(np.float32)
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, rows)
+        os.replace(path + ".tmp", path)
+        chunks.append(rows)
+        scored += len(rows)
+        if scored and (i + 1) % 20 == 0:
+            rate = scored / (time.perf_counter() - started)
+            print(f"⏳ Teacher: {min((i + 1) * chunk_size, len(texts))}/{len(texts)} texts ({rate:.0f} texts/s)")
+
+    print(f"✅ Teacher outputs: {len(texts)} texts, {scored} newly scored, cached in {directory}")
+    return np.vstack(chunks) if chunks else np.zeros((0, len(teacher.labels)), dtype=np.float32)
+
+
+def fit_student(texts, probabilities, labels, soft, alpha=ALPHA, chunk_size=4096):
+    # texts are cleaned; probabilities columns follow `labels`
+    label_encoder = LabelEncoder().fit(labels)
+    encoded = label_encoder.transform(labels)
+    classes = np.arange(len(labels))
+
+    vectorizer = make_vectorizer()
+    X = vectorizer.fit_transform(texts)
+
+    model = MultinomialNB(alpha=alpha)
+    if not soft:
+        model.fit(X, encoded[probabilities.argmax(axis=1)])
+        return model, vectorizer, label_encoder
+
+    for start in range(0, X.shape[0], chunk_size):
+        X_chunk = X[start:start + chunk_size]
+        weights = probabilities[start:start + chunk_size].astype(np.float64)
+        for column, class_id in enumerate(encoded):
+            model.partial_fit(
+                X_chunk, np.full(X_chunk.shape[0], class_id), classes=classes,
+                sample_weight=weights[:, column],
+            )
+    return model, vectorizer, label_encoder
+
+
+def student_latency(scorer, texts):
+    sample = texts[:200]
+    started = time.perf_counter()
+    for text in sample:
+        scorer.predict_proba([text])
+    single_us = (time.perf_counter() - started) / len(sample) * 1e6
+
+    batch = [texts[i % len(texts)] for i in range(1000)]
+    started = time.perf_counter()
+    scorer.predict_proba(batch)
+    batch_us = (time.perf_counter() - started) / len(batch) * 1e6
+    return single_us, batch_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill the transformer teacher into the TF-IDF + NB student")
+    parser.add_argument("--corpus", default="go_emotions_dataset.csv")
+    parser.add_argument("--labelled", action="store_true",
+                        help="corpus is in the training format; report accuracy on true labels")
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--labels", choices=("soft", "hard"), default="soft",
+                        help="train the student on teacher distributions or argmax labels")
+    parser.add_argument("--alpha", type=float, default=ALPHA)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="texts per teacher call")
+    parser.add_argument("--holdout", type=float, default=HOLDOUT_FRACTION,
+                        help="fraction held out for the report (0 trains on everything)")
+    parser.add_argument("--cache-dir", default=".train_cache")
+    parser.add_argument("--no-save", action="store_true", help="do not write the student artifacts")
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args()
+
+    texts, truth = load_corpus(args.corpus, args.labelled, args.text_column)
+    teacher = TransformerBackend.from_env()
+    labels = np.asarray(teacher.labels).astype(str)
+    print(f"✅ Corpus of {len(texts)} texts, teacher {teacher.model_dir} ({teacher.version})")
+
+    cache = StageCache(args.cache_dir)
+    key = cache.key("teacher", file_digest(args.corpus), {
+        "teacher": teacher.version, "labelled": args.labelled,
+        "text_column": args.text_column, "chunk_size": args.chunk_size,
+    })
+    probabilities = teacher_probabilities(
+        teacher, texts, os.path.join(args.cache_dir, f"teacher-{key}"), args.chunk_size)
+    teacher_labels = labels[probabilities.argmax(axis=1)]
+
+    cleaned = clean_texts(texts)
+    if args.holdout > 0:
+        train_rows, test_rows = holdout_split(teacher_labels, args.holdout)
+    else:
+        train_rows, test_rows = np.arange(len(texts)), np.arange(0)
+
+    started = time.perf_counter()
+    model, vectorizer, label_encoder = fit_student(
+        [cleaned[i] for i in train_rows], probabilities[train_rows], labels,
+        soft=args.labels == "soft", alpha=args.alpha,
+    )
+    print(f"✅ Student fitted on {len(train_rows)} texts with {args.labels} labels "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    scorer = FusedScorer.from_sklearn(vectorizer, model)
+    student_labels = label_encoder.inverse_transform(model.classes_).astype(str)
+    single_us, batch_us = student_latency(scorer, cleaned)
+    report = {
+        "labels": args.labels,
+        "train_texts": len(train_rows),
+        "holdout_texts": len(test_rows),
+        "student_single_us": single_us,
+        "student_batch_us_per_text": batch_us,
+    }
+
+    if len(test_rows):
+        test_texts = [cleaned[i] for i in test_rows]
+        student_pred = student_labels[scorer.predict_proba(test_texts).argmax(axis=1)]
+        report["agreement_with_teacher"] = float((student_pred == teacher_labels[test_rows]).mean())
+
+        if truth is not None:
+            # Plain NB on the true labels of the same training rows
+            training = pd.DataFrame({"text": [cleaned[i] for i in train_rows], "emotion": truth[train_rows]})
+            base_model, base_vectorizer, base_encoder = train(training, "upsample-rows", alpha=args.alpha)
+            base_labels = base_encoder.inverse_transform(base_model.classes_).astype(str)
+            base_pred = base_labels[base_model.predict_proba(base_vectorizer.transform(test_texts)).argmax(axis=1)]
+
+            test_truth = truth[test_rows].astype(str)
+            teacher_acc = float((teacher_labels[test_rows] == test_truth).mean())
+            student_acc = float((student_pred == test_truth).mean())
+            baseline_acc = float((base_pred == test_truth).mean())
+            gap = teacher_acc - baseline_acc
+            report.update({
+                "teacher_accuracy": teacher_acc,
+                "student_accuracy": student_acc,
+                "baseline_nb_accuracy": baseline_acc,
+                "accuracy_recovered": (student_acc - baseline_acc) / gap if gap > 0 else None,
+            })
+
+    print("\n📊 Distillation report")
+    for name, value in report.items():
+        print(f"   {name:<28}{value:.4f}" if isinstance(value, float) else f"   {name:<28}{value}")
+
+    if not args.no_save:
+        save_artifacts(model, vectorizer, label_encoder)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import argparse
+import json
+import time
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+from inference import FusedScorer
+from stage_cache import StageCache
+from train_model import ALPHA, BALANCE_MODES, prepare_data, train
+
+# ------------------------------------------------------------
+# 🔹 Held-Out Evaluation
+# ------------------------------------------------------------
+# Usage:
+#     python evaluate.py --output evaluation.json
+#     python evaluate.py --balance weighted --alpha 0.3 --engine sklearn
+#
+# The cleaned dataset (training stage cache) is split into a stratified
+# train / holdout set BEFORE any upsampling, so no copy of a holdout text
+# can leak into training. The model is trained on the training part with
+# the same code as train_model.py, then the holdout is scored in chunks of
+# --chunk-size texts: each chunk only adds to a running confusion matrix
+# (np.bincount over true * n_classes + predicted), so memory does not grow
+# with the holdout size. Precision, recall and F1 per class come from the
+# confusion matrix, and the scoring time of the same chunks gives the
+# throughput, so one run yields both a quality and a speed number.
+
+HOLDOUT_FRACTION = 0.2
+CHUNK_SIZE = 1024
+ENGINES = ("fused", "sklearn")
+
+
+def holdout_split(y, fraction=HOLDOUT_FRACTION, seed=42):
+    # Row positions of a stratified train / holdout split
+    return train_test_split(np.arange(len(y)), test_size=fraction, stratify=y, random_state=seed)
+
+
+def confusion_matrix(y_true, y_pred, n_classes):
+    # counts[i, j] = texts of class i predicted as class j
+    flat = np.asarray(y_true, dtype=np.int64) * n_classes + np.asarray(y_pred, dtype=np.int64)
+    return np.bincount(flat, minlength=n_classes * n_classes).reshape(n_classes, n_classes)
+
+
+def scores_from_confusion(counts):
+    # Per-class precision / recall / F1 (0 where undefined, as sklearn's
+    # zero_division default reports), accuracy and macro averages
+    counts = np.asarray(counts, dtype=np.float64)
+    true_positive = np.diag(counts)
+    support = counts.sum(axis=1)
+    predicted = counts.sum(axis=0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(predicted > 0, true_positive / predicted, 0.0)
+        recall = np.where(support > 0, true_positive / support, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+
+    total = counts.sum()
+    return {
+        "accuracy": float(true_positive.sum() / total) if total else 0.0,
+        "macro_precision": float(precision.mean()),
+        "macro_recall": float(recall.mean()),
+        "macro_f1": float(f1.mean()),
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+        "support": support.astype(np.int64),
+    }
+
+
+def make_score_fn(engine, model, vectorizer):
+    if engine == "fused":
+        scorer = FusedScorer.from_sklearn(vectorizer, model)
+        return lambda texts: scorer.predict_proba(texts)
+    return lambda texts: model.predict_proba(vectorizer.transform(texts))
+
+
+def evaluate_chunks(score_fn, texts, y_true, n_classes, chunk_size=CHUNK_SIZE):
+    counts = np.zeros((n_classes, n_classes), dtype=np.int64)
+    scoring_seconds = 0.0
+    for start in range(0, len(texts), chunk_size):
+        chunk = texts[start:start + chunk_size]
+        started = time.perf_counter()
+        probabilities = score_fn(chunk)
+        scoring_seconds += time.perf_counter() - started
+        counts += confusion_matrix(
+            y_true[start:start + chunk_size], np.argmax(probabilities, axis=1), n_classes)
+
+    return counts, {
+        "texts": len(texts),
+        "chunk_size": chunk_size,
+        "seconds": scoring_seconds,
+        "texts_per_second": len(texts) / scoring_seconds if scoring_seconds else None,
+        "us_per_text": scoring_seconds / len(texts) * 1e6 if len(texts) else None,
+    }
+
+
+def print_report(labels, scores, throughput):
+    print(f"\n{'emotion':<16}{'precision':>10}{'recall':>9}{'f1':>8}{'support':>9}")
+    for i, label in enumerate(labels):
+        print(f"{label:<16}{scores['precision'][i]:>10.3f}{scores['recall'][i]:>9.3f}"
+              f"{scores['f1'][i]:>8.3f}{scores['support'][i]:>9}")
+    print(f"\n🎯 Accuracy {scores['accuracy']:.4f}   macro-F1 {scores['macro_f1']:.4f}   "
+          f"macro precision {scores['macro_precision']:.4f}   macro recall {scores['macro_recall']:.4f}")
+    print(f"⏱️ {throughput['texts_per_second']:,.0f} texts/s "
+          f"({throughput['us_per_text']:.1f} us/text, chunks of {throughput['chunk_size']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the emotion model on a stratified holdout")
+    parser.add_argument("--data", default="go_emotions_dataset.csv")
+    parser.add_argument("--cache-dir", default=".train_cache")
+    parser.add_argument("--balance", choices=BALANCE_MODES, default="upsample-rows",
+                        help="class balancing for the training part (default upsample-rows, "
+                             "which builds the same model as train_model.py's default)")
+    parser.add_argument("--alpha", type=float, default=ALPHA)
+    parser.add_argument("--holdout", type=float, default=HOLDOUT_FRACTION)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--engine", choices=ENGINES, default="fused",
+                        help="scoring path to time (default fused, as served by app.py)")
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args()
+
+    data, _ = prepare_data(args.data, StageCache(args.cache_dir))
+    labels, y = np.unique(data["emotion"].to_numpy(), return_inverse=True)
+    train_rows, holdout_rows = holdout_split(y, args.holdout)
+    print(f"✅ Split {len(train_rows)} training / {len(holdout_rows)} holdout samples")
+
+    started = time.perf_counter()
+    model, vectorizer, label_encoder = train(data.iloc[train_rows], args.balance, alpha=args.alpha)
+    train_seconds = time.perf_counter() - started
+
+    # Model columns follow label_encoder.classes_, which are the same
+    # sorted labels as np.unique above
+    assert list(label_encoder.classes_) == list(labels)
+    texts = data["text"].iloc[holdout_rows].tolist()
+    counts, throughput = evaluate_chunks(
+        make_score_fn(args.engine, model, vectorizer), texts, y[holdout_rows], len(labels), args.chunk_size)
+    scores = scores_from_confusion(counts)
+    print_report(labels, scores, throughput)
+
+    if args.output:
+        report = {
+            "params": {"balance": args.balance, "alpha": args.alpha, "holdout": args.holdout,
+                       "engine": args.engine},
+            "train_seconds": train_seconds,
+            "labels": labels.tolist(),
+            "confusion_matrix": counts.tolist(),
+            **{k: v.tolist() if isinstance(v, np.ndarray) else v for k, v in scores.items()},
+            "throughput": throughput,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import gc
+import glob
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import thread_budget
+
+# ------------------------------------------------------------
+# 🔹 Production Serving (gunicorn)
+# ------------------------------------------------------------
+# Run with:
+#     gunicorn -c gunicorn.conf.py wsgi:app
+#
+# The master imports the app once (preload_app), so the model is loaded a
+# single time and inherited by every worker. gc.freeze() before each fork
+# moves all preloaded objects to the permanent generation: collections in
+# the workers then never write to their GC headers, and the pages holding
+# them stay shared copy-on-write instead of being slowly duplicated.
+
+workers = int(os.environ.get("WEB_CONCURRENCY", len(thread_budget.available_cpus())))
+
+# Thread budget per worker (thread_budget.py): available CPUs // workers,
+# or BLAS_THREADS when set. BLAS/OpenMP pools are sized when NumPy is
+# first imported, which happens while this master preloads the app, so
+# the limits go in the environment now; post_fork re-applies them in each
+# worker through threadpoolctl and torch.set_num_threads
+THREADS_PER_WORKER = int(os.environ.get("BLAS_THREADS", thread_budget.plan(workers)))
+thread_budget.set_thread_env(THREADS_PER_WORKER)
+PIN_WORKERS = os.environ.get("PIN_WORKERS", "0") == "1"
+
+# Firebase clients and background threads do not survive fork: let each
+# worker start its own initializer in post_fork instead of the master
+os.environ["FIREBASE_INIT_DEFERRED"] = "1"
+
+# Each process records metrics into its own file here; /metrics sums them.
+# Without METRICS_MULTIPROC_DIR a temporary directory is created (once: a
+# config reload finds the variable set) and removed again in on_exit
+METRICS_TEMP_PREFIX = "emotion-metrics-"
+if "METRICS_MULTIPROC_DIR" not in os.environ:
+    os.environ["METRICS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix=METRICS_TEMP_PREFIX)
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+GC_FREEZE = os.environ.get("GC_FREEZE", "1") == "1"
+
+if preload_app and GC_FREEZE:
+    # Keep the master from leaving freed holes in pages while preloading
+    gc.disable()
+
+
+def on_starting(server):
+    # Drop metrics left over from a previous run of the server
+    for path in glob.glob(os.path.join(os.environ["METRICS_MULTIPROC_DIR"], "metrics_*")):
+        os.remove(path)
+
+
+def on_exit(server):
+    # Remove the metrics directory if this config created it
+    directory = os.environ["METRICS_MULTIPROC_DIR"]
+    if (os.path.dirname(os.path.abspath(directory)) == os.path.abspath(tempfile.gettempdir())
+            and os.path.basename(directory).startswith(METRICS_TEMP_PREFIX)):
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def pre_fork(server, worker):
+    if preload_app and GC_FREEZE:
+        gc.freeze()
+
+    # Lowest CPU slice no live worker holds, so a restarted worker takes
+    # over the slice of the one it replaces
+    taken = {getattr(w, "cpu_slot", None) for w in server.WORKERS.values()}
+    worker.cpu_slot = next(slot for slot in range(len(taken) + 1) if slot not in taken)
+
+
+def post_fork(server, worker):
+    gc.enable()
+
+    cpus = thread_budget.cpu_slice(worker.cpu_slot, workers) if PIN_WORKERS else None
+    torch_threads = os.environ.get("TRANSFORMER_THREADS")
+    thread_budget.apply(THREADS_PER_WORKER, cpus, int(torch_threads) if torch_threads else None)
+
+    import app
+    app.start_firebase_init()
+    app.start_model_watch()
+
+
+def post_worker_init(worker):
+    # After gunicorn has installed the worker's own signal handlers:
+    # SIGHUP to a worker reloads its model instead of stopping it
+    import app
+    app.install_reload_signal()
@@ -0,0 +1,319 @@
+import math
+import re
+from collections import Counter
+from itertools import chain
+import numpy as np
+
+# ------------------------------------------------------------
+# 🔹 Fused TF-IDF + MultinomialNB Scorer
+# ------------------------------------------------------------
+# TfidfVectorizer followed by MultinomialNB is a linear function of the
+# token counts, so a text can be scored with a dict lookup per token and a
+# short accumulation over the matching weight rows, with no CSR matrix,
+# analyzer rebuild or input validation per request.
+#
+# The arithmetic mirrors sklearn/scipy operation for operation so results
+# are bit-for-bit identical to vectorizer.transform() + predict_proba():
+#   tfidf = count * idf                 (TfidfTransformer.transform)
+#   x     = tfidf / sqrt(sum(tfidf^2))  (sum in column order, normalize l2)
+#   jll   = 0 + sum(x_j * W[j])         (csr_matvecs, column order)
+#   jll  += class_log_prior
+#   proba = exp(jll - logsumexp(jll))   (predict_log_proba)
+# The idf is therefore kept per column and applied to the counts rather
+# than pre-multiplied into W: folding it in would change the rounding order.
+#
+# Only NumPy is needed: the bundle is read with model_bundle.load_bundle,
+# and logsumexp below is scipy's, ported. Serving a bundle therefore
+# imports neither sklearn, scipy nor pandas (see "Model Details" in
+# README.txt for the import times).
+
+# Up to this many texts, rows are scored one at a time; larger batches are
+# accumulated BLOCK_ROWS texts at a time
+SMALL_BATCH = 16
+BLOCK_ROWS = 512
+
+SUPPORTED_VECTORIZER_PARAMS = {
+    "analyzer": "word",
+    "binary": False,
+    "input": "content",
+    "norm": "l2",
+    "preprocessor": None,
+    "stop_words": None,
+    "strip_accents": None,
+    "sublinear_tf": False,
+    "tokenizer": None,
+    "use_idf": True,
+}
+
+
+def logsumexp(a):
+    # scipy.special.logsumexp(a, axis=1) as of scipy 1.15, step for step so
+    # the result is identical: the maxima are taken out of the sum and
+    # added back as log1p(sum / count) + log(count) + max
+    a = np.array(a, dtype=np.float64)
+    a_max = a.max(axis=1, keepdims=True)
+    is_max = a == a_max
+    a[is_max] = -np.inf
+    m = is_max.sum(axis=1, keepdims=True, dtype=a.dtype)
+    shift = np.where(np.isfinite(a_max), a_max, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s = np.exp(a - shift).sum(axis=1, keepdims=True, dtype=a.dtype)
+        s = np.where(s == 0, s, s / m)
+        out = np.log1p(s) + np.log(m) + a_max
+    return out[:, 0]
+
+
+def flatten(rows, dtype=np.float64):
+    # Feature rows as flat (row, column, value) arrays, row by row
+    lengths = np.fromiter((len(columns) for columns, _ in rows), dtype=np.intp, count=len(rows))
+    total = int(lengths.sum())
+    columns = np.fromiter(chain.from_iterable(columns for columns, _ in rows), dtype=np.intp, count=total)
+    values = np.fromiter(chain.from_iterable(values for _, values in rows), dtype=dtype, count=total)
+    return np.repeat(np.arange(len(rows)), lengths), columns, values
+
+
+def accumulate(jll, row_ids, columns, values, weights):
+    # jll[row] += value * weights[column] for every entry, each row adding
+    # its entries in the order given (column order, as csr_matvecs does).
+    # Rows are ranked by length, so the rows that have a k-th entry are
+    # always the first ones and step k adds one contiguous block of
+    # products: every row's first entry, then every row's second, ...
+    n = len(jll)
+    if len(row_ids) == 0:
+        return jll
+    lengths = np.bincount(row_ids, minlength=n)
+    positions = np.arange(len(row_ids)) - (np.cumsum(lengths) - lengths)[row_ids]
+    rank = np.empty(n, dtype=np.intp)
+    rank[np.argsort(-lengths, kind="stable")] = np.arange(n)
+    order = np.argsort(positions * n + rank[row_ids])
+    products = values[order, None] * weights[columns[order]]
+
+    ranked = np.zeros_like(jll)
+    start = 0
+    for active in np.cumsum(np.bincount(lengths)[::-1])[::-1][1:]:
+        ranked[:active] += products[start:start + active]
+        start += active
+    jll += ranked[rank]
+    return jll
+
+
+class FusedScorer:
+    def __init__(self, vocabulary, idf, feature_log_prob, class_log_prior, classes,
+                 token_pattern=r"(?u)\b\w\w+\b", ngram_range=(1, 2), lowercase=True):
+        self._init_terms(vocabulary, idf)
+        self.weights = np.ascontiguousarray(np.asarray(feature_log_prob).T, dtype=np.float64)
+        self.class_log_prior = np.asarray(class_log_prior, dtype=np.float64)
+        self.classes = np.asarray(classes)
+        self._init_analyzer(token_pattern, ngram_range, lowercase)
+
+    def _init_terms(self, vocabulary, idf):
+        # term -> column (the term's row of log-probabilities in
+        # self.weights), and the idf of every column as Python floats
+        self.vocabulary = {term: int(column) for term, column in vocabulary.items()}
+        self.idf = [float(value) for value in idf]
+
+    def _init_analyzer(self, token_pattern, ngram_range, lowercase):
+        self.token_pattern = re.compile(token_pattern)
+        if self.token_pattern.groups > 1:
+            raise ValueError("token_pattern must have at most one capturing group")
+        self.min_n, self.max_n = ngram_range
+        self.lowercase = lowercase
+
+    @classmethod
+    def from_sklearn(cls, vectorizer, model):
+        params = vectorizer.get_params()
+        for name, expected in SUPPORTED_VECTORIZER_PARAMS.items():
+            if params.get(name) != expected:
+                raise ValueError(f"Unsupported vectorizer setting {name}={params.get(name)!r}")
+        if not hasattr(model, "feature_log_prob_") or not hasattr(model, "class_log_prior_"):
+            raise ValueError(f"Unsupported model type {type(model).__name__}")
+
+        return cls(
+            vectorizer.vocabulary_,
+            vectorizer.idf_,
+            model.feature_log_prob_,
+            model.class_log_prior_,
+            model.classes_,
+            token_pattern=params["token_pattern"],
+            ngram_range=params["ngram_range"],
+            lowercase=params["lowercase"],
+        )
+
+    @classmethod
+    def load(cls, path):
+        # Scorer for the bundle directory at `path` (model_bundle.py)
+        from model_bundle import load_bundle
+        return cls.from_bundle(load_bundle(path))
+
+    @classmethod
+    def from_bundle(cls, bundle):
+        # Weight arrays stay views on the bundle's mmap (no copy)
+        if bundle.compact:
+            return CompactScorer.from_bundle(bundle)
+        settings = bundle.manifest["vectorizer"]
+        arrays = bundle.arrays
+        return cls(
+            bundle.vocabulary,
+            arrays["idf"],
+            arrays["feature_log_prob_t"].T,
+            arrays["class_log_prior"],
+            bundle.labels,
+            token_pattern=settings["token_pattern"],
+            ngram_range=tuple(settings["ngram_range"]),
+            lowercase=settings["lowercase"],
+        )
+
+    def analyze(self, text):
+        # Same tokens as TfidfVectorizer.build_analyzer() for a word analyzer
+        if self.lowercase:
+            text = text.lower()
+        tokens = self.token_pattern.findall(text)
+
+        min_n, max_n = self.min_n, self.max_n
+        if max_n == 1:
+            return tokens
+
+        ngrams = list(tokens) if min_n == 1 else []
+        for n in range(max(min_n, 2), min(max_n, len(tokens)) + 1):
+            ngrams.extend(map(" ".join, zip(*(tokens[i:] for i in range(n)))))
+        return ngrams
+
+    def features(self, text):
+        # Sparse TF-IDF row as parallel (columns, values) in column order
+        counts = Counter(map(self.vocabulary.get, self.analyze(text)))
+        counts.pop(None, None)
+
+        columns = sorted(counts)
+        idf = self.idf
+        values = [counts[column] * idf[column] for column in columns]
+
+        squared_sum = 0.0
+        for value in values:
+            squared_sum += value * value
+        if squared_sum != 0.0:
+            norm = math.sqrt(squared_sum)
+            values = [value / norm for value in values]
+
+        return columns, values
+
+    def transform(self, texts):
+        return [self.features(text) for text in texts]
+
+    def joint_log_likelihood_features(self, rows):
+        weights = self.weights
+        jll = np.zeros((len(rows), len(self.class_log_prior)))
+        if len(rows) <= SMALL_BATCH:
+            for accumulator, (columns, values) in zip(jll, rows):
+                for column, value in zip(columns, values):
+                    accumulator += value * weights[column]
+        else:
+            for start in range(0, len(rows), BLOCK_ROWS):
+                accumulate(jll[start:start + BLOCK_ROWS], *flatten(rows[start:start + BLOCK_ROWS]), weights)
+        jll += self.class_log_prior
+        return jll
+
+    def predict_proba_features(self, rows):
+        jll = self.joint_log_likelihood_features(rows)
+        log_prob_x = logsumexp(jll)
+        return np.exp(jll - np.atleast_2d(log_prob_x).T)
+
+    def joint_log_likelihood(self, texts):
+        return self.joint_log_likelihood_features(self.transform(texts))
+
+    def predict_proba(self, texts):
+        return self.predict_proba_features(self.transform(texts))
+
+    def predict(self, texts):
+        return self.classes[np.argmax(self.joint_log_likelihood(texts), axis=1)]
+
+    def inverse_transform(self, columns):
+        # Labels of output columns (e.g. argmax of predict_proba); for a
+        # bundle these are the decoded emotions, as label_encoder gives them
+        return self.classes[np.asarray(columns)]
+
+
+# ------------------------------------------------------------
+# 🔹 Compact Scorer (quantized / pruned bundles)
+# ------------------------------------------------------------
+# Scores a compact bundle (model_bundle.export_compact_bundle). Features
+# are computed as above; weight_rows maps each column to its row in the
+# stored weights, and terms whose weights were pruned (-1) still count
+# towards the l2 norm but add nothing to the class scores. The weights are
+# read as stored (float32, or int8 with a per-class affine scale):
+#   jll = (x @ W) + class_log_prior                           float32
+#   jll = (x @ Q) * scale + sum(x_kept) * offset + prior      int8
+# with x @ W accumulated in float32, a block of texts at a time. Results
+# are close to the full model's, not bit-for-bit equal. Small batches
+# gather each text's weight rows and combine them with one dot product.
+
+
+class CompactScorer(FusedScorer):
+    def __init__(self, vocabulary, idf, weight_rows, weights, class_log_prior, classes,
+                 scale=None, offset=None, token_pattern=r"(?u)\b\w\w+\b", ngram_range=(1, 2),
+                 lowercase=True):
+        self._init_terms(vocabulary, idf)
+        self.weight_rows = np.asarray(weight_rows, dtype=np.intp)
+        self.weights = weights
+        self.scale = None if scale is None else np.asarray(scale, dtype=np.float64)
+        self.offset = None if offset is None else np.asarray(offset, dtype=np.float64)
+        self.class_log_prior = np.asarray(class_log_prior, dtype=np.float64)
+        self.classes = np.asarray(classes)
+        self._init_analyzer(token_pattern, ngram_range, lowercase)
+
+    @classmethod
+    def from_bundle(cls, bundle):
+        settings = bundle.manifest["vectorizer"]
+        arrays = bundle.arrays
+        return cls(
+            bundle.vocabulary,
+            arrays["idf"],
+            arrays["weight_rows"],
+            arrays["weights"],
+            arrays["class_log_prior"],
+            bundle.labels,
+            scale=arrays.get("weight_scale"),
+            offset=arrays.get("weight_offset"),
+            token_pattern=settings["token_pattern"],
+            ngram_range=tuple(settings["ngram_range"]),
+            lowercase=settings["lowercase"],
+        )
+
+    def joint_log_likelihood_features(self, rows):
+        if len(rows) <= SMALL_BATCH:
+            return self._small_batch_jll(rows)
+
+        jll = np.zeros((len(rows), len(self.class_log_prior)))
+        kept_sums = np.zeros((len(rows), 1))
+        for start in range(0, len(rows), BLOCK_ROWS):
+            block = rows[start:start + BLOCK_ROWS]
+            row_ids, columns, values = flatten(block, np.float32)
+            weight_rows = self.weight_rows[columns]
+            kept = weight_rows >= 0
+            row_ids, weight_rows, values = row_ids[kept], weight_rows[kept], values[kept]
+
+            block_jll = np.zeros((len(block), len(self.class_log_prior)), dtype=np.float32)
+            jll[start:start + len(block)] = accumulate(block_jll, row_ids, weight_rows, values, self.weights)
+            kept_sums[start:start + len(block), 0] = np.bincount(row_ids, weights=values, minlength=len(block))
+        if self.scale is not None:
+            jll *= self.scale
+            jll += kept_sums * self.offset
+        jll += self.class_log_prior
+        return jll
+
+    def _small_batch_jll(self, rows):
+        weights = self.weights
+        jll = np.zeros((len(rows), len(self.class_log_prior)))
+        kept_sums = np.zeros((len(rows), 1))
+        for i, (columns, values) in enumerate(rows):
+            if not columns:
+                continue
+            weight_rows = self.weight_rows[columns]
+            kept = weight_rows >= 0
+            kept_values = np.asarray(values)[kept]
+            jll[i] = kept_values @ weights[weight_rows[kept]]
+            kept_sums[i] = kept_values.sum()
+        if self.scale is not None:
+            jll *= self.scale
+            jll += kept_sums * self.offset
+        jll += self.class_log_prior
+        return jll
@@ -0,0 +1,89 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+import psutil
+
+# ------------------------------------------------------------
+# 🔹 Per-Worker Memory Measurement
+# ------------------------------------------------------------
+# Starts gunicorn with each serving configuration, sends some traffic, and
+# reports RSS / USS / PSS per worker. USS (pages private to the worker) is
+# the number that preload + gc.freeze is meant to shrink; RSS also counts
+# the pages still shared with the master.
+
+CONFIGS = {
+    "no-preload": {"GUNICORN_PRELOAD": "0", "GC_FREEZE": "0", "INFERENCE_ENGINE": "sklearn"},
+    "preload": {"GUNICORN_PRELOAD": "1", "GC_FREEZE": "0", "INFERENCE_ENGINE": "sklearn"},
+    "preload+freeze": {"GUNICORN_PRELOAD": "1", "GC_FREEZE": "1", "INFERENCE_ENGINE": "sklearn"},
+    "preload+freeze+bundle": {"GUNICORN_PRELOAD": "1", "GC_FREEZE": "1", "INFERENCE_ENGINE": "fused"},
+}
+
+
+def wait_ready(port, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/readyz", timeout=1) as r:
+                if r.status == 200:
+                    return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+def send_traffic(port, requests):
+    for i in range(requests):
+        body = json.dumps({"text": f"i am so happy today number {i}"}).encode()
+        req = urllib.request.Request(
+            f"http://127.0.0.1:{port}/predict", data=body,
+            headers={"Content-Type": "application/json"},
+        )
+        urllib.request.urlopen(req, timeout=10).read()
+
+
+def measure(name, env_overrides, workers, requests, port):
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), PORT=str(port),
+               FIREBASE_INIT_ATTEMPTS="1", **env_overrides)
+    master = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_ready(port)
+        send_traffic(port, requests)
+        time.sleep(1)
+
+        rows = []
+        for worker in psutil.Process(master.pid).children():
+            info = worker.memory_full_info()
+            rows.append({"rss": info.rss, "uss": info.uss, "pss": info.pss})
+
+        mb = lambda key: sum(r[key] for r in rows) / len(rows) / 2**20
+        return {
+            "config": name,
+            "workers": len(rows),
+            "rss_mb": round(mb("rss"), 1),
+            "uss_mb": round(mb("uss"), 1),
+            "pss_mb": round(mb("pss"), 1),
+        }
+    finally:
+        master.terminate()
+        master.wait(30)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure memory per gunicorn worker")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--port", type=int, default=5057)
+    parser.add_argument("--config", choices=sorted(CONFIGS), action="append")
+    args = parser.parse_args()
+
+    print(f"{'config':<24}{'workers':>8}{'RSS MB':>9}{'USS MB':>9}{'PSS MB':>9}")
+    for name in args.config or list(CONFIGS):
+        row = measure(name, CONFIGS[name], args.workers, args.requests, args.port)
+        print(f"{row['config']:<24}{row['workers']:>8}{row['rss_mb']:>9}{row['uss_mb']:>9}{row['pss_mb']:>9}")
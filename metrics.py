@@ -0,0 +1,345 @@
+import bisect
+import glob
+import os
+import threading
+import time
+import numpy as np
+
+# ------------------------------------------------------------
+# 🔹 Metrics (Prometheus text format, multi-process aware)
+# ------------------------------------------------------------
+# Every counter, gauge and histogram bucket is one float64 slot in a
+# per-process store. With METRICS_MULTIPROC_DIR set (gunicorn.conf.py does
+# this), the store is a memory-mapped file per process:
+#     metrics_<pid>.db    float64 values, one per slot
+#     metrics_<pid>.keys  slot names, one per line, append-only
+# so recording is a plain array update, and /metrics in any worker sums
+# the files of all workers. Counters and histograms keep the values of
+# exited workers; gauges only count live processes.
+#
+# Without the directory the store is an in-memory array (single process).
+
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+STORE_CAPACITY = 8192
+
+
+class ProcessStore:
+    def __init__(self, directory, capacity=STORE_CAPACITY):
+        self.directory = directory
+        self.capacity = capacity
+        self.pid = os.getpid()
+        self.slots = {}
+        self.lock = threading.Lock()
+        self.full = False
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            base = os.path.join(directory, f"metrics_{self.pid}")
+            self.values = np.memmap(base + ".db", dtype=np.float64, mode="w+", shape=(capacity,))
+            self.keys_file = open(base + ".keys", "w", encoding="utf-8")
+        else:
+            self.values = np.zeros(capacity)
+            self.keys_file = None
+
+    def slot(self, key):
+        index = self.slots.get(key)
+        if index is not None:
+            return index
+
+        with self.lock:
+            index = self.slots.get(key)
+            if index is not None:
+                return index
+            if len(self.slots) >= self.capacity:
+                if not self.full:
+                    print(f"⚠️ Metrics store full ({self.capacity} slots), dropping {key}")
+                    self.full = True
+                return None
+
+            index = len(self.slots)
+            if self.keys_file is not None:
+                self.keys_file.write(key + "\n")
+                self.keys_file.flush()
+            self.slots[key] = index
+            return index
+
+    def add(self, key, amount):
+        index = self.slot(key)
+        if index is not None:
+            with self.lock:
+                self.values[index] += amount
+
+    def set(self, key, value):
+        index = self.slot(key)
+        if index is not None:
+            self.values[index] = value
+
+    def local_values(self):
+        return {key: float(self.values[index]) for key, index in list(self.slots.items())}
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MetricsRegistry:
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.metrics = {}
+        self.store = ProcessStore(directory)
+        # A forked worker gets its own store and starts from zero
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        self.store = ProcessStore(self.directory)
+
+    def register(self, metric):
+        existing = self.metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self.metrics[metric.name] = metric
+        return metric
+
+    def add(self, key, amount):
+        self.store.add(key, amount)
+
+    def set(self, key, value):
+        self.store.set(key, value)
+
+    def collect(self, live_only=frozenset()):
+        # Sum of every process's slots; keys of metrics named in live_only
+        # are skipped for processes that have exited
+        if not self.directory:
+            return self.store.local_values()
+
+        totals = {}
+        for keys_path in glob.glob(os.path.join(self.directory, "metrics_*.keys")):
+            pid = int(os.path.basename(keys_path)[len("metrics_"):-len(".keys")])
+            alive = pid_alive(pid)
+            try:
+                with open(keys_path, encoding="utf-8") as f:
+                    keys = f.read().splitlines()
+                values = np.fromfile(keys_path[:-len(".keys")] + ".db", dtype=np.float64)
+            except OSError:
+                continue
+
+            for key, value in zip(keys, values):
+                if not alive and key.split("{", 1)[0].split("\t", 1)[0] in live_only:
+                    continue
+                totals[key] = totals.get(key, 0.0) + float(value)
+        return totals
+
+    def render(self):
+        live_only = {name for name, metric in self.metrics.items() if metric.kind == "gauge"}
+        values = self.collect(live_only)
+
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render(values))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry(os.environ.get("METRICS_MULTIPROC_DIR"))
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels) + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def series_of(values, name):
+    # Label strings recorded for a metric, e.g. '{stage="parse"}'
+    series = set()
+    for key in values:
+        series_key = key.split("\t", 1)[0]
+        if series_key.split("{", 1)[0] == name:
+            series.add(series_key[len(name):])
+    return sorted(series)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.registry = registry
+        self.children = {}
+        self.lock = threading.Lock()
+        registry.register(self)
+
+    def labels(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self.children.get(key)
+        if child is None:
+            with self.lock:
+                child = self.children.get(key)
+                if child is None:
+                    child = self.child_class(self, format_labels(list(zip(self.labelnames, key))))
+                    self.children[key] = child
+        return child
+
+    def _default(self):
+        return self.labels()
+
+
+class CounterChild:
+    def __init__(self, metric, label_string):
+        self.registry = metric.registry
+        self.key = f"{metric.name}{label_string}\tvalue"
+
+    def inc(self, amount=1.0):
+        self.registry.add(self.key, amount)
+
+    def set_total(self, value):
+        # For components that keep their own running total
+        self.registry.set(self.key, value)
+
+
+class GaugeChild(CounterChild):
+    def set(self, value):
+        self.registry.set(self.key, value)
+
+
+class Counter(Metric):
+    kind = "counter"
+    child_class = CounterChild
+
+    def inc(self, amount=1.0):
+        self._default().inc(amount)
+
+    def render(self, values):
+        lines = []
+        for series in series_of(values, self.name):
+            value = values.get(f"{self.name}{series}\tvalue", 0.0)
+            lines.append(f"{self.name}{series} {format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+    child_class = GaugeChild
+
+    def set(self, value):
+        self._default().set(value)
+
+
+class HistogramChild:
+    def __init__(self, metric, label_string):
+        self.registry = metric.registry
+        self.buckets = metric.buckets
+        prefix = f"{metric.name}{label_string}\t"
+        self.bucket_keys = [f"{prefix}b{i}" for i in range(len(self.buckets) + 1)]
+        self.sum_key = prefix + "sum"
+        self.count_key = prefix + "count"
+
+    def observe(self, value):
+        registry = self.registry
+        registry.add(self.bucket_keys[bisect.bisect_left(self.buckets, value)], 1)
+        registry.add(self.sum_key, value)
+        registry.add(self.count_key, 1)
+
+    def time(self):
+        return StageTimer(self)
+
+
+class StageTimer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+class Histogram(Metric):
+    kind = "histogram"
+    child_class = HistogramChild
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS, labelnames=(), registry=REGISTRY):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help, labelnames, registry)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def render(self, values):
+        lines = []
+        bounds = self.buckets + (float("inf"),)
+        for series in series_of(values, self.name):
+            prefix = f"{self.name}{series}\t"
+            inner = series[1:-1]
+            cumulative = 0.0
+            for i, bound in enumerate(bounds):
+                cumulative += values.get(f"{prefix}b{i}", 0.0)
+                labels = f'{inner},le="{format_value(bound)}"' if inner else f'le="{format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{{{labels}}} {format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{series} {format_value(values.get(prefix + 'sum', 0.0))}")
+            lines.append(f"{self.name}_count{series} {format_value(values.get(prefix + 'count', 0.0))}")
+        return lines
+
+    def snapshot(self, **labels):
+        # JSON-friendly view of one series, summed over all processes
+        values = self.registry.collect()
+        prefix = f"{self.name}{format_labels(list(zip(self.labelnames, (str(labels[n]) for n in self.labelnames))))}\t"
+        counts = [values.get(f"{prefix}b{i}", 0.0) for i in range(len(self.buckets) + 1)]
+        total, value_sum = values.get(prefix + "count", 0.0), values.get(prefix + "sum", 0.0)
+
+        cumulative, buckets = 0.0, {}
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            buckets[format_value(bound)] = int(cumulative)
+
+        return {
+            "buckets": buckets,
+            "count": int(total),
+            "sum": value_sum,
+            "mean": value_sum / total if total else None,
+            "p50": bucket_quantile(self.buckets, counts, 0.5),
+            "p99": bucket_quantile(self.buckets, counts, 0.99),
+        }
+
+
+def bucket_quantile(buckets, counts, q):
+    # Upper bound of the bucket holding the q-th observation
+    total = sum(counts)
+    if not total:
+        return None
+    rank, seen = q * total, 0.0
+    for bound, count in zip(tuple(buckets) + (float("inf"),), counts):
+        seen += count
+        if seen >= rank:
+            return bound
+    return float("inf")
@@ -0,0 +1,232 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import numpy as np
+
+# ------------------------------------------------------------
+# 🔹 Memory-Mappable Model Bundle
+# ------------------------------------------------------------
+# A bundle is a directory with:
+#   manifest.json        format/version, labels and vectorizer settings
+#   weights.safetensors  every array the scorer needs:
+#       feature_log_prob_t  (n_features, n_classes) float64, row per term
+#       class_log_prior     (n_classes,) float64
+#       idf                 (n_features,) float64
+#       vocab_bytes         sorted terms, UTF-8, concatenated
+#       vocab_offsets       (n_features + 1,) uint32 into vocab_bytes
+# Terms are stored in sorted order and term i owns column i, which is also
+# the column order TfidfVectorizer uses, so scoring stays bit-for-bit equal.
+#
+# A compact bundle (format_version 2, see export_compact_bundle) stores
+# only what serving needs, with smaller weights instead of
+# feature_log_prob_t:
+#       weights             (n_kept, n_classes) float32 or int8
+#       weight_rows         (n_features,) int32, row in weights or -1 (pruned)
+#       weight_scale, weight_offset  (n_classes,) float64, int8 only
+#       idf                 float32
+# Its scores are close to, not equal to, the full model's.
+#
+# The safetensors file is opened with mmap and arrays are NumPy views on the
+# mapping: nothing is unpickled or copied, and every worker process reading
+# the same bundle shares one page-cache copy of the weights.
+
+BUNDLE_FORMAT = "emotion-bundle"
+BUNDLE_FORMAT_VERSION = 1
+# Compact bundles (export_compact_bundle): quantized, optionally pruned
+COMPACT_FORMAT_VERSION = 2
+COMPACT_DTYPES = ("float32", "int8")
+MANIFEST_FILE = "manifest.json"
+WEIGHTS_FILE = "weights.safetensors"
+
+SAFETENSORS_DTYPES = {
+    "F64": np.float64,
+    "F32": np.float32,
+    "I64": np.int64,
+    "I32": np.int32,
+    "U32": np.uint32,
+    "I8": np.int8,
+    "U8": np.uint8,
+}
+
+
+def vocab_tensors(terms):
+    encoded = [term.encode("utf-8") for term in terms]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+    np.cumsum([len(term) for term in encoded], out=offsets[1:])
+    return {
+        "vocab_bytes": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        "vocab_offsets": offsets,
+    }
+
+
+def write_bundle(path, tensors, manifest):
+    # Weights first, manifest last: a bundle with a manifest is complete.
+    # The version is the hash of the weights file.
+    import xxhash
+    from safetensors.numpy import save_file
+
+    os.makedirs(path, exist_ok=True)
+    weights_path = os.path.join(path, WEIGHTS_FILE)
+    save_file(tensors, weights_path + ".tmp", metadata={"format": BUNDLE_FORMAT})
+
+    digest = xxhash.xxh3_64()
+    with open(weights_path + ".tmp", "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+
+    manifest = {"format": BUNDLE_FORMAT, "version": digest.hexdigest(), **manifest}
+    os.replace(weights_path + ".tmp", weights_path)
+    with open(os.path.join(path, MANIFEST_FILE + ".tmp"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(os.path.join(path, MANIFEST_FILE + ".tmp"), os.path.join(path, MANIFEST_FILE))
+    return manifest
+
+
+def serving_manifest(vectorizer, model, label_encoder, n_features):
+    params = vectorizer.get_params()
+    return {
+        "labels": [str(label) for label in label_encoder.inverse_transform(model.classes_)],
+        "vectorizer": {
+            "token_pattern": params["token_pattern"],
+            "ngram_range": list(params["ngram_range"]),
+            "lowercase": params["lowercase"],
+        },
+        "n_features": n_features,
+    }
+
+
+def export_bundle(vectorizer, model, label_encoder, path):
+    terms = sorted(vectorizer.vocabulary_)
+    columns = np.array([vectorizer.vocabulary_[term] for term in terms])
+
+    tensors = {
+        "feature_log_prob_t": np.ascontiguousarray(model.feature_log_prob_.T[columns], dtype=np.float64),
+        "class_log_prior": np.ascontiguousarray(model.class_log_prior_, dtype=np.float64),
+        "idf": np.ascontiguousarray(vectorizer.idf_[columns], dtype=np.float64),
+        **vocab_tensors(terms),
+    }
+    return write_bundle(path, tensors, {
+        "format_version": BUNDLE_FORMAT_VERSION,
+        **serving_manifest(vectorizer, model, label_encoder, len(terms)),
+    })
+
+
+def quantize_weights(weights, dtype):
+    # weights: (n_terms, n_classes). int8 is affine per class,
+    #     weight ~= q * scale[class] + offset[class]
+    # with the class's range mapped onto -127..127
+    if dtype == "float32":
+        return weights.astype(np.float32), None, None
+    low, high = weights.min(axis=0), weights.max(axis=0)
+    offset = (high + low) / 2
+    scale = np.where(high > low, (high - low) / 254, 1.0)
+    q = np.clip(np.rint((weights - offset) / scale), -127, 127).astype(np.int8)
+    return q, scale, offset
+
+
+def term_spread(model):
+    # Standard deviation of each term's log-probability across classes
+    return np.asarray(model.feature_log_prob_, dtype=np.float64).std(axis=0)
+
+
+def export_compact_bundle(vectorizer, model, label_encoder, path, dtype="int8", min_spread=0.0):
+    # Serving-only bundle with float32 or int8 weights. Terms whose
+    # log-probability varies less than `min_spread` (std across classes, in
+    # nats) lose their weights: such a term adds nearly the same amount to
+    # every class, which the softmax cancels. Pruned terms keep their idf,
+    # so they still count towards each text's l2 norm.
+    if dtype not in COMPACT_DTYPES:
+        raise ValueError(f"dtype must be one of {COMPACT_DTYPES}")
+
+    terms = sorted(vectorizer.vocabulary_)
+    columns = np.array([vectorizer.vocabulary_[term] for term in terms])
+    weights = np.asarray(model.feature_log_prob_, dtype=np.float64).T[columns]
+
+    keep = term_spread(model)[columns] >= min_spread
+    weight_rows = np.where(keep, np.cumsum(keep) - 1, -1).astype(np.int32)
+
+    quantized, scale, offset = quantize_weights(weights[keep], dtype)
+    tensors = {
+        "weights": np.ascontiguousarray(quantized),
+        "weight_rows": weight_rows,
+        "class_log_prior": np.ascontiguousarray(model.class_log_prior_, dtype=np.float64),
+        "idf": np.ascontiguousarray(vectorizer.idf_[columns], dtype=np.float32),
+        **vocab_tensors(terms),
+    }
+    if scale is not None:
+        tensors["weight_scale"] = scale
+        tensors["weight_offset"] = offset
+
+    return write_bundle(path, tensors, {
+        "format_version": COMPACT_FORMAT_VERSION,
+        "weights": {"dtype": dtype, "min_spread": min_spread, "pruned_terms": int((~keep).sum())},
+        **serving_manifest(vectorizer, model, label_encoder, len(terms)),
+    })
+
+
+class ModelBundle:
+    def __init__(self, path):
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != BUNDLE_FORMAT:
+            raise ValueError(f"{path} is not an {BUNDLE_FORMAT} bundle")
+        if self.manifest.get("format_version") not in (BUNDLE_FORMAT_VERSION, COMPACT_FORMAT_VERSION):
+            raise ValueError(f"Unsupported bundle format version {self.manifest.get('format_version')}")
+
+        self.path = path
+        self.version = self.manifest["version"]
+        self.labels = np.array(self.manifest["labels"])
+        self.compact = self.manifest["format_version"] == COMPACT_FORMAT_VERSION
+        self.arrays = self._map_tensors(os.path.join(path, WEIGHTS_FILE))
+
+    def _map_tensors(self, weights_path):
+        # safetensors layout: u64 header length, JSON header, raw data
+        with open(weights_path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (header_size,) = struct.unpack("<Q", self.mmap[:8])
+        header = json.loads(self.mmap[8:8 + header_size])
+        data_start = 8 + header_size
+
+        arrays = {}
+        for name, info in header.items():
+            if name == "__metadata__":
+                continue
+            dtype = np.dtype(SAFETENSORS_DTYPES[info["dtype"]])
+            begin, end = info["data_offsets"]
+            array = np.frombuffer(
+                self.mmap, dtype=dtype, count=(end - begin) // dtype.itemsize,
+                offset=data_start + begin,
+            )
+            arrays[name] = array.reshape(info["shape"])
+        return arrays
+
+    @property
+    def vocabulary(self):
+        data = self.arrays["vocab_bytes"].tobytes()
+        offsets = self.arrays["vocab_offsets"].tolist()
+        return {
+            data[offsets[i]:offsets[i + 1]].decode("utf-8"): i
+            for i in range(len(offsets) - 1)
+        }
+
+
+def load_bundle(path):
+    return ModelBundle(path)
+
+
+# ------------------------------------------------------------
+# 🔹 Convert the pickled artifacts into a bundle
+# ------------------------------------------------------------
+if __name__ == "__main__":
+    import pickle
+
+    target = sys.argv[1] if len(sys.argv) > 1 else "model_bundle"
+    model = pickle.load(open("emotion_model.pkl", "rb"))
+    vectorizer = pickle.load(open("vectorizer.pkl", "rb"))
+    label_encoder = pickle.load(open("label_encoder.pkl", "rb"))
+
+    manifest = export_bundle(vectorizer, model, label_encoder, target)
+    print(f"✅ Exported model bundle {manifest['version']} to {target}/")
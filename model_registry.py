@@ -0,0 +1,311 @@
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+import numpy as np
+
+from model_bundle import MANIFEST_FILE, load_bundle
+from preprocessing import clean_texts
+
+# ------------------------------------------------------------
+# 🔹 Versioned Model Registry
+# ------------------------------------------------------------
+# Layout:
+#   model_registry/
+#     versions/<version>/   one model bundle per version (manifest.json +
+#                           weights.safetensors, see model_bundle.py)
+#     ACTIVE                the version workers should serve
+#     golden.jsonl          optional golden set: {"text": ..., "emotion": ...}
+#
+# Publishing copies a bundle into versions/ under a temporary name and
+# renames it into place; activating rewrites ACTIVE the same way, so a
+# reader never sees a half-written version or pointer.
+#
+#     python model_registry.py publish model_bundle [--activate]
+#     python model_registry.py activate <version>
+#     python model_registry.py list
+#
+# Serving side (app.py): every request takes the current ServedModel from a
+# ModelSlot and uses it until it has answered. A reload loads the new
+# version next to the old one, validates it on the golden set and swaps
+# the slot; the old version is released (its batcher stopped, its mmap
+# dropped) once the last request holding it has finished.
+
+ACTIVE_FILE = "ACTIVE"
+VERSIONS_DIR = "versions"
+GOLDEN_FILE = "golden.jsonl"
+
+# Sanity texts for registries without a golden set
+DEFAULT_GOLDEN_TEXTS = (
+    "I am so happy today!",
+    "This is the worst day ever.",
+    "I feel really sad and alone.",
+    "I am nervous about tomorrow's exam.",
+)
+
+
+class ModelRegistry:
+    def __init__(self, root):
+        self.root = root
+        self.versions_dir = os.path.join(root, VERSIONS_DIR)
+
+    def exists(self):
+        return os.path.isdir(self.versions_dir)
+
+    def versions(self):
+        if not self.exists():
+            return []
+        return sorted(
+            name for name in os.listdir(self.versions_dir)
+            if os.path.exists(os.path.join(self.versions_dir, name, MANIFEST_FILE))
+        )
+
+    def path(self, version):
+        return os.path.join(self.versions_dir, version)
+
+    def active(self):
+        try:
+            with open(os.path.join(self.root, ACTIVE_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def publish(self, bundle_dir, activate=False):
+        # Copy a bundle in as a new version (named by its content hash)
+        with open(os.path.join(bundle_dir, MANIFEST_FILE)) as f:
+            version = json.load(f)["version"]
+
+        target = self.path(version)
+        if not os.path.exists(os.path.join(target, MANIFEST_FILE)):
+            os.makedirs(self.versions_dir, exist_ok=True)
+            staging = f"{target}.tmp-{os.getpid()}"
+            shutil.rmtree(staging, ignore_errors=True)
+            shutil.copytree(bundle_dir, staging)
+            shutil.rmtree(target, ignore_errors=True)
+            os.replace(staging, target)
+
+        if activate:
+            self.activate(version)
+        return version
+
+    def activate(self, version):
+        if version not in self.versions():
+            raise ValueError(f"Unknown model version {version!r}")
+        pointer = os.path.join(self.root, ACTIVE_FILE)
+        with open(pointer + ".tmp", "w") as f:
+            f.write(version + "\n")
+        os.replace(pointer + ".tmp", pointer)
+
+    def load(self, version):
+        return load_bundle(self.path(version))
+
+    def golden(self):
+        # [(text, expected emotion or None)]
+        path = os.path.join(self.root, GOLDEN_FILE)
+        if not os.path.exists(path):
+            return [(text, None) for text in DEFAULT_GOLDEN_TEXTS]
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        return [(row["text"], row.get("emotion")) for row in rows]
+
+
+def validate(predict_proba, labels, golden, min_accuracy=0.0):
+    # Score the golden set with a candidate; raises ValueError when its
+    # output is malformed or its accuracy is below min_accuracy
+    texts = [text for text, _ in golden]
+    probabilities = np.asarray(predict_proba(texts), dtype=np.float64)
+
+    if probabilities.shape != (len(texts), len(labels)):
+        raise ValueError(f"Expected {(len(texts), len(labels))} probabilities, got {probabilities.shape}")
+    if not np.isfinite(probabilities).all():
+        raise ValueError("Non-finite probabilities on the golden set")
+    if not np.allclose(probabilities.sum(axis=1), 1.0, atol=1e-6):
+        raise ValueError("Probability rows do not sum to 1")
+
+    report = {"golden_texts": len(texts)}
+    labelled = [i for i, (_, emotion) in enumerate(golden) if emotion is not None]
+    if labelled:
+        predicted = np.asarray(labels).astype(str)[probabilities[labelled].argmax(axis=1)]
+        expected = np.array([golden[i][1] for i in labelled]).astype(str)
+        report["accuracy"] = float((predicted == expected).mean())
+        if report["accuracy"] < min_accuracy:
+            raise ValueError(f"Golden set accuracy {report['accuracy']:.4f} below {min_accuracy}")
+    return report
+
+
+class ServedModel:
+    # One loaded version: the backend, its labels and version, plus the
+    # requests currently using it
+    def __init__(self, backend, version, batcher=None):
+        self.backend = backend
+        self.labels = backend.labels
+        self.version = version
+        self.batcher = batcher
+        self.in_flight = 0
+        self.retired = False
+        self.loaded_at = time.time()
+
+    def release(self):
+        if self.batcher is not None:
+            self.batcher.close()
+        self.backend.close()
+        print(f"♻️ Released model version {self.version}")
+        self.backend = self.batcher = None
+
+
+class ModelSlot:
+    # The ServedModel requests should use; swapped atomically
+    def __init__(self, served=None):
+        self.current = served
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        return SlotLease(self)
+
+    def swap(self, served):
+        with self.lock:
+            old, self.current = self.current, served
+            if old is None:
+                return None
+            old.retired = True
+            idle = old.in_flight == 0
+        if idle:
+            old.release()
+        return old
+
+    def _enter(self):
+        with self.lock:
+            served = self.current
+            if served is not None:
+                served.in_flight += 1
+        return served
+
+    def _exit(self, served):
+        with self.lock:
+            served.in_flight -= 1
+            idle = served.retired and served.in_flight == 0
+        if idle:
+            served.release()
+
+
+class SlotLease:
+    def __init__(self, slot):
+        self.slot = slot
+        self.served = None
+
+    def __enter__(self):
+        self.served = self.slot._enter()
+        return self.served
+
+    def __exit__(self, *exc):
+        if self.served is not None:
+            self.slot._exit(self.served)
+        return False
+
+
+class ModelReloader:
+    # Loads, validates and swaps in a registry version in a background
+    # thread; one reload at a time. `build(version)` returns a ServedModel.
+    # `loaded` is the registry version in the slot (the served version
+    # differs for a cascade, whose version also covers the slow tier).
+    def __init__(self, registry, slot, build, loaded=None, min_accuracy=0.0, on_swap=None):
+        self.registry = registry
+        self.slot = slot
+        self.build = build
+        self.loaded = loaded
+        self.rejected = None
+        self.min_accuracy = min_accuracy
+        self.on_swap = on_swap
+        self.lock = threading.Lock()
+        self.status = {"state": "idle", "version": loaded, "error": None, "validation": None}
+
+    def reload(self, version=None, activate=False):
+        # Start loading `version` (default: the ACTIVE one); False when a
+        # reload is already running or there is nothing new to load. With
+        # activate, ACTIVE points at the version once it has passed
+        # validation (at once if this worker already serves it), so the
+        # other workers follow it.
+        version = version or self.registry.active()
+        if version is None:
+            return False
+        if version == self.loaded:
+            if activate and self.registry.active() != version:
+                self.registry.activate(version)
+            return False
+        if not self.lock.acquire(blocking=False):
+            return False
+        self.status = {"state": "loading", "version": version, "error": None, "validation": None}
+        threading.Thread(target=self._load, args=(version, activate), name="model-reload", daemon=True).start()
+        return True
+
+    def _load(self, version, activate):
+        try:
+            started = time.perf_counter()
+            served = self.build(version)
+            backend = served.backend
+            validation = validate(
+                lambda texts: backend.predict_proba(clean_texts(texts) if backend.clean_input else texts),
+                served.labels, self.registry.golden(), self.min_accuracy,
+            )
+            self.slot.swap(served)
+            self.loaded = version
+            if activate:
+                self.registry.activate(version)
+            if self.on_swap is not None:
+                self.on_swap(served)
+            self.status = {"state": "swapped", "version": version, "error": None, "validation": validation,
+                           "seconds": time.perf_counter() - started}
+            print(f"✅ Serving model version {version} ({validation})")
+        except Exception as e:
+            self.rejected = version
+            self.status = {"state": "failed", "version": version, "error": str(e), "validation": None}
+            print(f"❌ Model version {version} rejected: {e}")
+        finally:
+            self.lock.release()
+
+    def watch(self, interval):
+        # Follow the ACTIVE pointer, so a version activated through one
+        # worker (or the CLI) reaches every worker
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    # A version that failed validation is retried only on
+                    # an explicit reload, not on every check
+                    if self.registry.active() != self.rejected:
+                        self.reload()
+                except Exception as e:
+                    print(f"⚠️ Model registry check failed: {e}")
+
+        threading.Thread(target=run, name="model-registry-watch", daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the versioned model registry")
+    parser.add_argument("--registry", default=os.environ.get("MODEL_REGISTRY", "model_registry"))
+    commands = parser.add_subparsers(dest="command", required=True)
+    publish = commands.add_parser("publish", help="copy a bundle in as a new version")
+    publish.add_argument("bundle", nargs="?", default="model_bundle")
+    publish.add_argument("--activate", action="store_true")
+    activate = commands.add_parser("activate", help="point ACTIVE at a version")
+    activate.add_argument("version")
+    commands.add_parser("list", help="list versions")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.registry)
+    if args.command == "publish":
+        version = registry.publish(args.bundle, activate=args.activate)
+        print(f"✅ Published {version}{' (active)' if args.activate else ''}")
+    elif args.command == "activate":
+        registry.activate(args.version)
+        print(f"✅ Active version is now {args.version}")
+    else:
+        active = registry.active()
+        for version in registry.versions():
+            print(f"{'*' if version == active else ' '} {version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import json
+import zlib
+
+# ------------------------------------------------------------
+# 🔹 Streaming NDJSON Request Bodies
+# ------------------------------------------------------------
+# /predict/stream reads its body through these generators instead of
+# request.get_data(), so a request of any size is held as at most one
+# read (READ_BYTES), one decompressed piece of the same size and one
+# partial line (max_line_bytes):
+#   read_chunks   raw body in READ_BYTES reads; with gzip, inflated
+#                 incrementally and never more than READ_BYTES at a time
+#                 (so a small compressed body cannot expand all at once)
+#   read_lines    complete, non-blank lines; an over-long line is
+#                 reported as LINE_TOO_LONG and skipped up to its newline
+#   parse_line    one line -> (item, error)
+# Nothing is read ahead: the next read happens only when the caller asks
+# for more lines, which is what gives the endpoint its backpressure.
+
+READ_BYTES = 64 * 1024
+GZIP_ENCODINGS = ("gzip", "x-gzip")
+
+# Marker yielded by read_lines in place of a line longer than the limit
+LINE_TOO_LONG = object()
+
+
+class StreamError(ValueError):
+    # The body cannot be decoded (corrupt or truncated gzip)
+    pass
+
+
+def read_chunks(stream, gzipped=False, read_bytes=READ_BYTES):
+    if not gzipped:
+        while True:
+            chunk = stream.read(read_bytes)
+            if not chunk:
+                return
+            yield chunk
+
+    # wbits 16 + MAX_WBITS: gzip framing. Concatenated gzip members (as
+    # written by `cat a.gz b.gz` or pigz) are decoded one after another.
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    in_member = False
+    while True:
+        pending = stream.read(read_bytes)
+        if not pending:
+            break
+        while pending:
+            in_member = True
+            try:
+                data = decompressor.decompress(pending, read_bytes)
+            except zlib.error as e:
+                raise StreamError(f"Invalid gzip body: {e}") from e
+            pending = decompressor.unconsumed_tail
+            if decompressor.eof:
+                pending = decompressor.unused_data
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                in_member = False
+            if data:
+                yield data
+    if in_member:
+        raise StreamError("Truncated gzip body")
+
+
+def read_lines(chunks, max_line_bytes):
+    # Lines without their newline (a trailing "\r" is left to json.loads,
+    # which treats it as whitespace)
+    buffer = b""
+    skipping = False
+    for chunk in chunks:
+        if skipping:
+            newline = chunk.find(b"\n")
+            if newline < 0:
+                continue
+            chunk = chunk[newline + 1:]
+            skipping = False
+
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if len(line) > max_line_bytes:
+                yield LINE_TOO_LONG
+            elif line.strip():
+                yield line
+
+        if len(buffer) > max_line_bytes:
+            yield LINE_TOO_LONG
+            buffer = b""
+            skipping = True
+
+    if buffer.strip() and not skipping:
+        yield buffer
+
+
+def parse_line(line):
+    # (item, error): an object such as {"id": ..., "text": ...}, or a bare
+    # JSON string taken as the text
+    if line is LINE_TOO_LONG:
+        return None, "Line too long"
+    try:
+        item = json.loads(line)
+    except ValueError:
+        return None, "Invalid JSON"
+    if isinstance(item, str):
+        item = {"text": item}
+    return item, None
@@ -0,0 +1,153 @@
+import threading
+from collections import OrderedDict
+import xxhash
+
+# ------------------------------------------------------------
+# 🔹 Prediction Cache (LRU + TinyLFU admission)
+# ------------------------------------------------------------
+# Results are keyed by a 128-bit xxh3 hash of the model version and the
+# normalized text. Entries live in an LRU bounded by both an entry count and
+# a byte budget. When the cache is full, a new text is only admitted if a
+# count-min sketch says it has been requested more often than the LRU victim,
+# so a burst of one-off texts cannot flush the hot ones.
+
+# Rough per-entry bookkeeping cost (dict slot, OrderedDict links, int key)
+ENTRY_OVERHEAD_BYTES = 200
+
+
+def normalize_text(text):
+    # The NB model lowercases and splits on non-word characters, so case
+    # and runs of whitespace never change its prediction. Backends that
+    # score the raw text (transformer, cascade) must not be keyed on this
+    return " ".join(text.lower().split())
+
+
+class FrequencySketch:
+    # Count-min sketch with 4-bit saturating counters and periodic halving,
+    # so old popularity fades out over time
+
+    def __init__(self, width, depth=4):
+        self.width = 1
+        while self.width < width:
+            self.width <<= 1
+        self.mask = self.width - 1
+        self.depth = depth
+        self.table = bytearray(self.width * depth)
+        self.additions = 0
+        self.sample_size = 10 * self.width
+
+    def _slots(self, key):
+        for row in range(self.depth):
+            yield row * self.width + ((key >> (row * 32)) & self.mask)
+
+    def increment(self, key):
+        table = self.table
+        for slot in self._slots(key):
+            if table[slot] < 15:
+                table[slot] += 1
+
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self.table = bytearray(count >> 1 for count in table)
+            self.additions //= 2
+
+    def frequency(self, key):
+        table = self.table
+        return min(table[slot] for slot in self._slots(key))
+
+    def clear(self):
+        self.table = bytearray(len(self.table))
+        self.additions = 0
+
+
+class PredictionCache:
+    def __init__(self, max_entries=10000, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.sketch = FrequencySketch(max(256, 4 * max_entries))
+        self.lock = threading.Lock()
+        self.model_version = None
+        self.current_bytes = 0
+        self.hits = self.misses = self.evictions = self.rejections = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def set_model_version(self, version):
+        # A different model artifact invalidates every cached result
+        with self.lock:
+            if version != self.model_version:
+                self._clear()
+                self.model_version = version
+
+    def key(self, text, version=None, normalize=True):
+        # `version` of the model that will score the text; requests still
+        # on a retired model must not fill the cache for the new one.
+        # normalize=False keys on the exact text, for case-sensitive backends
+        version = self.model_version if version is None else version
+        if normalize:
+            text = normalize_text(text)
+        return xxhash.xxh3_128_intdigest(f"{version}\0{text}")
+
+    def get(self, key):
+        with self.lock:
+            self.sketch.increment(key)
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = value.nbytes + ENTRY_OVERHEAD_BYTES
+        if not self.enabled or size > self.max_bytes:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                return
+
+            # Make room, but only at the expense of colder entries
+            while self.entries and (
+                len(self.entries) >= self.max_entries
+                or self.current_bytes + size > self.max_bytes
+            ):
+                victim_key, victim = next(iter(self.entries.items()))
+                if self.sketch.frequency(key) <= self.sketch.frequency(victim_key):
+                    self.rejections += 1
+                    return
+                del self.entries[victim_key]
+                self.current_bytes -= victim.nbytes + ENTRY_OVERHEAD_BYTES
+                self.evictions += 1
+
+            self.entries[key] = value
+            self.current_bytes += size
+
+    def _clear(self):
+        self.entries.clear()
+        self.sketch.clear()
+        self.current_bytes = 0
+
+    def clear(self):
+        with self.lock:
+            self._clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "model_version": self.model_version,
+                "entries": len(self.entries),
+                "bytes": self.current_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "rejections": self.rejections,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
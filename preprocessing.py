@@ -0,0 +1,62 @@
+import re
+
+# ------------------------------------------------------------
+# 🔹 Text Preprocessing (shared by training and serving)
+# ------------------------------------------------------------
+# clean_text() is the cleaning step the model was trained with:
+#     lowercase, drop URLs, keep only a-z and whitespace, collapse spaces
+# It used to live in train_model.py only, so /predict scored raw text that
+# the model never saw during training. Both sides now import it from here.
+#
+# The fast version returns exactly what the original regex chain returns
+# (reference_clean_text below), character for character:
+#   - URLs are only searched for when the text contains "http"
+#   - ASCII texts drop everything but a-z and whitespace with one
+#     str.translate call; other texts use one precompiled regex
+#   - whitespace is collapsed with str.split / " ".join, which splits on
+#     the same Unicode whitespace as the regex \s
+# clean_texts() / clean_series() apply it to a list or a pandas column.
+
+URL_PATTERN = re.compile(r"http\S+")
+NON_LETTER_PATTERN = re.compile(r"[^a-z\s]+")
+
+# Every ASCII character except a-z and whitespace maps to None (deleted);
+# uppercase letters are already gone after lower()
+ASCII_DELETE_TABLE = {
+    code: None
+    for code in range(128)
+    if not ("a" <= chr(code) <= "z" or chr(code).isspace())
+}
+
+
+def reference_clean_text(text):
+    # The original train_model.py implementation, kept for parity checks
+    text = str(text).lower()
+    text = re.sub(r"http\S+", "", text)  # remove URLs
+    text = re.sub(r"[^a-z\s]", "", text)  # keep only letters and spaces
+    text = re.sub(r"\s+", " ", text).strip()
+    return text
+
+
+def clean_text(text):
+    text = str(text).lower()
+    if "http" in text:
+        text = URL_PATTERN.sub("", text)
+    if text.isascii():
+        text = text.translate(ASCII_DELETE_TABLE)
+    else:
+        text = NON_LETTER_PATTERN.sub("", text)
+    return " ".join(text.split())
+
+
+def clean_texts(texts):
+    return [clean_text(text) for text in texts]
+
+
+def clean_series(texts):
+    # Whole-column version for pandas. A chain of Series.str methods was
+    # measured at about 0.6x the speed of this list pass (each .str step is
+    # itself a Python loop per row), so the column is cleaned in one pass
+    import pandas as pd
+
+    return pd.Series(clean_texts(texts.tolist()), index=texts.index, name=texts.name)
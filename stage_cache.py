@@ -0,0 +1,202 @@
+import glob
+import json
+import os
+import pickle
+import time
+import numpy as np
+import xxhash
+
+# ------------------------------------------------------------
+# 🔹 Content-Addressed Stage Cache (training pipeline)
+# ------------------------------------------------------------
+# Every training stage's output is stored under a key that is the xxhash of
+# the stage name, its code version, the key of the stage it reads from and
+# its own parameters:
+#     key(load)      = h("load", <CSV content hash>)
+#     key(label)     = h("label", key(load))
+#     key(balance)   = h("balance", key(clean), {"balance": "upsample"})
+#     key(fit)       = h("fit", key(vectorize), {"alpha": 0.5})
+# so a change anywhere invalidates that stage and everything after it, and
+# nothing before it. Since no key depends on a stage's output, the whole
+# chain is known before anything runs: lazy() stages read or compute their
+# output only when a later stage that missed asks for it, so a rerun loads
+# just the last cached stage before the first changed one.
+# Files are <stage>-<key>.<ext> in the cache directory:
+#     .parquet  pandas frames (pyarrow)
+#     .npz      NumPy arrays; CSR matrices are stored as their data,
+#               indices, indptr and shape arrays
+#     .pkl      fitted estimators
+# Bump a stage's entry in STAGE_VERSIONS when its code changes meaning.
+
+STAGE_VERSIONS = {
+    "load": 1,
+    "label": 1,
+    "clean": 1,
+    "balance": 1,
+    "vectorize": 1,
+    "fit": 2,
+    "export": 1,
+    "sweep": 1,
+    "teacher": 1,
+}
+
+# Older entries of a stage beyond this many are deleted on write
+MAX_ENTRIES_PER_STAGE = 4
+
+
+def file_digest(path):
+    digest = xxhash.xxh3_128()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FrameStore:
+    suffix = ".parquet"
+
+    def save(self, path, frame):
+        frame.to_parquet(path, engine="pyarrow")
+
+    def load(self, path):
+        import pandas as pd
+
+        return pd.read_parquet(path, engine="pyarrow")
+
+
+class ArrayStore:
+    # dict of name -> ndarray or scipy.sparse CSR matrix
+    suffix = ".npz"
+
+    def save(self, path, arrays):
+        import scipy.sparse as sp
+
+        flat = {}
+        for name, value in arrays.items():
+            if sp.issparse(value):
+                value = value.tocsr()
+                flat[f"{name}.csr_data"] = value.data
+                flat[f"{name}.csr_indices"] = value.indices
+                flat[f"{name}.csr_indptr"] = value.indptr
+                flat[f"{name}.csr_shape"] = np.array(value.shape)
+            else:
+                flat[name] = np.asarray(value)
+        with open(path, "wb") as f:
+            np.savez(f, **flat)
+
+    def load(self, path):
+        import scipy.sparse as sp
+
+        with np.load(path, allow_pickle=False) as npz:
+            flat = {name: npz[name] for name in npz.files}
+
+        arrays = {}
+        for name, value in flat.items():
+            if name.endswith(".csr_data"):
+                base = name[:-len(".csr_data")]
+                arrays[base] = sp.csr_matrix(
+                    (value, flat[base + ".csr_indices"], flat[base + ".csr_indptr"]),
+                    shape=tuple(flat[base + ".csr_shape"]),
+                )
+            elif ".csr_" not in name:
+                arrays[name] = value
+        return arrays
+
+
+class PickleStore:
+    suffix = ".pkl"
+
+    def save(self, path, value):
+        with open(path, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load(self, path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+class JsonStore:
+    suffix = ".json"
+
+    def save(self, path, value):
+        with open(path, "w") as f:
+            json.dump(value, f)
+
+    def load(self, path):
+        with open(path) as f:
+            return json.load(f)
+
+
+FRAME = FrameStore()
+ARRAYS = ArrayStore()
+PICKLE = PickleStore()
+JSON = JsonStore()
+
+
+class StageCache:
+    def __init__(self, directory=".train_cache", enabled=True):
+        self.directory = directory
+        self.enabled = enabled
+        if enabled:
+            os.makedirs(directory, exist_ok=True)
+
+    def key(self, stage, parent, params=None):
+        payload = json.dumps(
+            [stage, STAGE_VERSIONS[stage], parent, params], sort_keys=True, default=str
+        )
+        return xxhash.xxh3_64_hexdigest(payload)
+
+    def path(self, stage, key, store):
+        return os.path.join(self.directory, f"{stage}-{key}{store.suffix}")
+
+    def get(self, stage, key, store):
+        if not self.enabled:
+            return None
+        path = self.path(stage, key, store)
+        if not os.path.exists(path):
+            return None
+        try:
+            return store.load(path)
+        except Exception as e:  # truncated or unreadable entry: recompute
+            print(f"⚠️ Ignoring unreadable cache entry {path}: {e}")
+            return None
+
+    def put(self, stage, key, store, value):
+        if not self.enabled:
+            return
+        path = self.path(stage, key, store)
+        store.save(path + ".tmp", value)
+        os.replace(path + ".tmp", path)
+        self._prune(stage, store)
+
+    def _prune(self, stage, store):
+        entries = glob.glob(os.path.join(self.directory, f"{stage}-*{store.suffix}"))
+        entries.sort(key=os.path.getmtime, reverse=True)
+        for stale in entries[MAX_ENTRIES_PER_STAGE:]:
+            os.remove(stale)
+
+    def run(self, stage, key, store, compute):
+        # Cached output of the stage if present, otherwise compute and store it
+        started = time.perf_counter()
+        value = self.get(stage, key, store)
+        if value is not None:
+            os.utime(self.path(stage, key, store))
+            print(f"♻️ Stage {stage}: cached ({key}, {time.perf_counter() - started:.2f}s)")
+            return value
+
+        value = compute()
+        self.put(stage, key, store, value)
+        print(f"⚙️ Stage {stage}: computed ({key}, {time.perf_counter() - started:.2f}s)")
+        return value
+
+    def lazy(self, stage, key, store, compute):
+        # Deferred run(): a callable returning the stage output, loaded or
+        # computed on first call. `compute` (and the inputs it holds) is
+        # dropped once it has run, so earlier outputs can be freed
+        state = {"compute": compute}
+
+        def value():
+            if "value" not in state:
+                state["value"] = self.run(stage, key, store, state.pop("compute"))
+            return state["value"]
+        return value
@@ -0,0 +1,317 @@
+import argparse
+import itertools
+import json
+import os
+import pickle
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer
+from sklearn.linear_model import SGDClassifier
+from sklearn.naive_bayes import ComplementNB, MultinomialNB
+
+from evaluate import HOLDOUT_FRACTION, confusion_matrix, holdout_split, scores_from_confusion
+from stage_cache import StageCache
+from train_model import ALPHA, MAX_FEATURES, NGRAM_RANGE, prepare_data, restore_vectorizer
+
+# ------------------------------------------------------------
+# 🔹 Hyperparameter Sweep (accuracy vs latency)
+# ------------------------------------------------------------
+# Usage:
+#     python sweep.py --workers 4 --output sweep.json
+#     python sweep.py --max-features 2000 5000 --ngram 1,1 1,2 --model multinomial
+#
+# 1. The cleaned dataset comes from the training stage cache, is split into
+#    the same stratified train / holdout set as evaluate.py, and every text is tokenized ONCE
+#    into a count matrix with the largest n-gram range of the grid.
+# 2. That matrix, the labels and the raw holdout texts are written as .npy
+#    files and every pool worker opens them with mmap_mode="r", so the
+#    dataset lives once in the page cache instead of once per worker.
+# 3. A candidate selects its columns from the shared matrix (n-gram range,
+#    then the max_features most frequent training terms, exactly as
+#    TfidfVectorizer.fit would), fits TF-IDF and the classifier on the
+#    training rows and scores the holdout rows.
+# 4. Latency is measured afterwards in this process, one candidate at a
+#    time, so workers competing for CPU do not skew it: one text per call
+#    through vectorizer.transform + predict_proba, and one batch call.
+# Classes are balanced with per-class sample weights (train_model.py
+# --balance weighted) rather than by upsampling every candidate.
+
+MODELS = ("multinomial", "complement", "sgd")
+DEFAULT_MAX_FEATURES = (2000, 5000, 10000, 20000)
+DEFAULT_NGRAMS = ((1, 1), (1, 2))
+DEFAULT_NB_ALPHAS = (0.1, 0.5, 1.0)
+DEFAULT_SGD_ALPHAS = (1e-5, 1e-4)
+
+LATENCY_TEXTS = 200
+LATENCY_BATCH = 1000
+
+SHARED_FILES = (
+    "train_data", "train_indices", "train_indptr",
+    "test_data", "test_indices", "test_indptr",
+    "y_train", "y_test", "sample_weight", "train_tf", "term_n",
+    "term_bytes", "term_offsets", "text_bytes", "text_offsets",
+)
+
+
+def encode_strings(strings):
+    # UTF-8 bytes + offsets, the layout model_bundle uses for the vocabulary
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(s) for s in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def decode_strings(data, offsets, indices):
+    return [bytes(data[offsets[i]:offsets[i + 1]]).decode("utf-8") for i in indices]
+
+
+# ------------------------------------------------------------
+# 🔹 Shared dataset (written once, memory-mapped by every worker)
+# ------------------------------------------------------------
+def build_shared_dataset(data, directory, max_n):
+    texts = data["text"].to_numpy()
+    labels, y = np.unique(data["emotion"].to_numpy(), return_inverse=True)
+    train_rows, test_rows = holdout_split(y)
+
+    counter = CountVectorizer(ngram_range=(1, max_n), dtype=np.float64)
+    counter.fit(texts[train_rows])
+    terms = counter.get_feature_names_out()
+    train_counts = counter.transform(texts[train_rows])
+    test_counts = counter.transform(texts[test_rows])
+
+    class_counts = np.bincount(y[train_rows], minlength=len(labels))
+    class_weight = class_counts.max() / np.maximum(class_counts, 1)
+
+    arrays = {
+        "train_data": train_counts.data, "train_indices": train_counts.indices,
+        "train_indptr": train_counts.indptr,
+        "test_data": test_counts.data, "test_indices": test_counts.indices,
+        "test_indptr": test_counts.indptr,
+        "y_train": y[train_rows], "y_test": y[test_rows],
+        "sample_weight": class_weight[y[train_rows]],
+        "train_tf": np.asarray(train_counts.sum(axis=0)).ravel(),
+        "term_n": np.array([term.count(" ") + 1 for term in terms], dtype=np.int8),
+    }
+    arrays["term_bytes"], arrays["term_offsets"] = encode_strings(terms)
+    arrays["text_bytes"], arrays["text_offsets"] = encode_strings(texts[test_rows])
+
+    os.makedirs(directory, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, name + ".npy"), array)
+    with open(os.path.join(directory, "meta.json"), "w") as f:
+        json.dump({"labels": labels.tolist(), "n_terms": len(terms)}, f)
+
+
+def load_shared_dataset(directory):
+    with open(os.path.join(directory, "meta.json")) as f:
+        meta = json.load(f)
+    arrays = {name: np.load(os.path.join(directory, name + ".npy"), mmap_mode="r") for name in SHARED_FILES}
+
+    shape = len(arrays["train_indptr"]) - 1, meta["n_terms"]
+    arrays["train"] = sp.csr_matrix(
+        (arrays["train_data"], arrays["train_indices"], arrays["train_indptr"]), shape=shape, copy=False)
+    shape = len(arrays["test_indptr"]) - 1, meta["n_terms"]
+    arrays["test"] = sp.csr_matrix(
+        (arrays["test_data"], arrays["test_indices"], arrays["test_indptr"]), shape=shape, copy=False)
+    arrays["labels"] = meta["labels"]
+    return arrays
+
+
+shared = None
+
+
+def init_worker(directory):
+    global shared
+    shared = load_shared_dataset(directory)
+
+
+# ------------------------------------------------------------
+# 🔹 Candidates
+# ------------------------------------------------------------
+def build_grid(args):
+    grid = []
+    for max_features, ngram_range in itertools.product(args.max_features, args.ngram):
+        for model in args.model:
+            alphas = args.sgd_alpha if model == "sgd" else args.alpha
+            for alpha in alphas:
+                grid.append({
+                    "model": model,
+                    "max_features": max_features,
+                    "ngram_range": ngram_range,
+                    "alpha": alpha,
+                })
+    return grid
+
+
+def make_model(candidate):
+    if candidate["model"] == "multinomial":
+        return MultinomialNB(alpha=candidate["alpha"])
+    if candidate["model"] == "complement":
+        return ComplementNB(alpha=candidate["alpha"])
+    return SGDClassifier(loss="log_loss", alpha=candidate["alpha"], max_iter=20, tol=None, random_state=42)
+
+
+def select_columns(candidate):
+    # Same vocabulary as TfidfVectorizer(max_features, ngram_range).fit on
+    # the training texts: terms are in sorted order, so taking the n-gram
+    # subset and running CountVectorizer's own top-k argsort picks (and ties)
+    # the same columns
+    min_n, max_n = candidate["ngram_range"]
+    term_n = shared["term_n"]
+    columns = np.flatnonzero((term_n >= min_n) & (term_n <= max_n) & (shared["train_tf"] > 0))
+    if candidate["max_features"] and len(columns) > candidate["max_features"]:
+        tfs = shared["train_tf"][columns]
+        columns = np.sort(columns[(-tfs).argsort()[:candidate["max_features"]]])
+    return columns
+
+
+def evaluate_candidate(candidate):
+    started = time.perf_counter()
+    columns = select_columns(candidate)
+
+    train_counts = shared["train"][:, columns]
+    transformer = TfidfTransformer().fit(train_counts)
+    X_train = transformer.transform(train_counts, copy=False)
+    X_test = transformer.transform(shared["test"][:, columns])
+
+    model = make_model(candidate)
+    model.fit(X_train, shared["y_train"], sample_weight=np.asarray(shared["sample_weight"]))
+    scores = scores_from_confusion(
+        confusion_matrix(shared["y_test"], model.predict(X_test), len(shared["labels"])))
+
+    terms = decode_strings(shared["term_bytes"], shared["term_offsets"], columns)
+    vectorizer = restore_vectorizer(
+        terms, transformer.idf_, candidate["max_features"], tuple(candidate["ngram_range"]))
+    artifact = pickle.dumps((vectorizer, model), protocol=pickle.HIGHEST_PROTOCOL)
+
+    return {
+        **candidate,
+        "n_features": len(columns),
+        "accuracy": scores["accuracy"],
+        "macro_f1": scores["macro_f1"],
+        "fit_seconds": time.perf_counter() - started,
+        "artifact_bytes": len(artifact),
+        "artifact": artifact,
+    }
+
+
+def measure_latency(result, texts):
+    vectorizer, model = pickle.loads(result.pop("artifact"))
+    single = texts[:LATENCY_TEXTS]
+    batch = [texts[i % len(texts)] for i in range(LATENCY_BATCH)]
+
+    model.predict_proba(vectorizer.transform(single[:10]))
+    samples = []
+    for text in single:
+        started = time.perf_counter()
+        model.predict_proba(vectorizer.transform([text]))
+        samples.append(time.perf_counter() - started)
+    result["single_us"] = statistics.median(samples) * 1e6
+
+    rounds = []
+    for _ in range(3):
+        started = time.perf_counter()
+        model.predict_proba(vectorizer.transform(batch))
+        rounds.append(time.perf_counter() - started)
+    result["batch_us_per_text"] = min(rounds) / len(batch) * 1e6
+    return result
+
+
+def pareto_front(results, objective):
+    # Candidates no other candidate beats on both the objective and latency
+    ordered = sorted(results, key=lambda r: (r["single_us"], -r[objective]))
+    front, best = [], -1.0
+    for result in ordered:
+        if result[objective] > best:
+            front.append(result)
+            best = result[objective]
+    return front
+
+
+def describe(result):
+    ngram = "{}-{}".format(*result["ngram_range"])
+    return f"{result['model']:<12}{result['max_features']:>7}{ngram:>6}{result['alpha']:>9g}"
+
+
+def print_table(results, title):
+    print(f"\n{title}")
+    print(f"{'model':<12}{'feat':>7}{'ngram':>6}{'alpha':>9}{'acc':>8}{'macroF1':>9}"
+          f"{'single us':>11}{'batch us':>10}{'size KB':>9}")
+    for r in results:
+        print(f"{describe(r)}{r['accuracy']:>8.3f}{r['macro_f1']:>9.3f}"
+              f"{r['single_us']:>11.0f}{r['batch_us_per_text']:>10.1f}{r['artifact_bytes'] / 1024:>9.0f}")
+
+
+def parse_ngram(value):
+    low, high = (int(part) for part in value.split(","))
+    return low, high
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep model hyperparameters for accuracy vs latency")
+    parser.add_argument("--data", default="go_emotions_dataset.csv")
+    parser.add_argument("--cache-dir", default=".train_cache")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--model", nargs="+", choices=MODELS, default=list(MODELS))
+    parser.add_argument("--max-features", nargs="+", type=int, default=list(DEFAULT_MAX_FEATURES))
+    parser.add_argument("--ngram", nargs="+", type=parse_ngram, default=list(DEFAULT_NGRAMS),
+                        help="n-gram ranges as min,max (default 1,1 1,2)")
+    parser.add_argument("--alpha", nargs="+", type=float, default=list(DEFAULT_NB_ALPHAS),
+                        help="smoothing for the Naive Bayes models")
+    parser.add_argument("--sgd-alpha", nargs="+", type=float, default=list(DEFAULT_SGD_ALPHAS),
+                        help="regularization for the SGD model")
+    parser.add_argument("--objective", choices=("accuracy", "macro_f1"), default="macro_f1")
+    parser.add_argument("--target", type=float,
+                        help="print the fastest candidate whose objective reaches this value")
+    parser.add_argument("--output", help="write every result and the Pareto front as JSON")
+    args = parser.parse_args()
+
+    cache = StageCache(args.cache_dir)
+    data, key = prepare_data(args.data, cache)
+
+    max_n = max(high for _, high in args.ngram)
+    directory = os.path.join(args.cache_dir, f"sweep-{cache.key('sweep', key, {'max_n': max_n, 'holdout': HOLDOUT_FRACTION})}")
+    if not os.path.exists(os.path.join(directory, "meta.json")):
+        build_shared_dataset(data, directory, max_n)
+    del data
+
+    grid = build_grid(args)
+    print(f"⏱️ Evaluating {len(grid)} candidates on {args.workers} workers (dataset in {directory})")
+    started = time.perf_counter()
+    with ProcessPoolExecutor(args.workers, initializer=init_worker, initargs=(directory,)) as pool:
+        results = list(pool.map(evaluate_candidate, grid))
+    print(f"✅ Fitted and scored in {time.perf_counter() - started:.1f}s")
+
+    init_worker(directory)
+    texts = decode_strings(shared["text_bytes"], shared["text_offsets"], range(len(shared["text_offsets"]) - 1))
+    results = [measure_latency(result, texts) for result in results]
+
+    results.sort(key=lambda r: -r[args.objective])
+    front = pareto_front(results, args.objective)
+    print_table(results, "All candidates (best first):")
+    print_table(front, f"Pareto front ({args.objective} vs single-text latency, fastest first):")
+
+    baseline = {"model": "multinomial", "max_features": MAX_FEATURES, "ngram_range": NGRAM_RANGE, "alpha": ALPHA}
+    for result in results:
+        if all(result[k] == v for k, v in baseline.items()):
+            print(f"\n📌 Current model: {args.objective} {result[args.objective]:.3f}, "
+                  f"single {result['single_us']:.0f} us")
+
+    if args.target is not None:
+        meeting = [r for r in front if r[args.objective] >= args.target]
+        if meeting:
+            print(f"🎯 Fastest with {args.objective} >= {args.target}: {describe(meeting[0])}")
+        else:
+            print(f"⚠️ No candidate reaches {args.objective} >= {args.target}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"objective": args.objective, "results": results, "pareto_front": front}, f, indent=2)
+        print(f"✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
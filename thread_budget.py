@@ -0,0 +1,122 @@
+import os
+import sys
+
+# ------------------------------------------------------------
+# 🔹 Per-Worker Thread Budget
+# ------------------------------------------------------------
+# N gunicorn workers that each let NumPy/SciPy's BLAS, OpenMP and torch
+# start one thread per core run N x cores threads on cores cores, and the
+# preempted threads show up as tail latency. Each worker therefore gets
+#     budget = available CPUs // workers   (at least 1)
+# threads per pool:
+#   - the *_NUM_THREADS variables, for pools created after this point
+#   - threadpoolctl for the BLAS / OpenMP pools already loaded
+#   - torch.set_num_threads when torch is imported (transformer backend)
+# and, optionally, its own slice of the CPUs through os.sched_setaffinity,
+# so workers do not migrate onto each other's cores.
+#
+# "Available CPUs" is the process affinity set, which follows taskset and
+# container cpusets, falling back to psutil's logical CPU count.
+#
+# The effective values (read back from threadpoolctl and torch, not the
+# requested ones) are reported per worker on /metrics:
+#     emotion_worker_threads{pid, pool="budget"|"blas"|"openmp"|"torch"}
+#     emotion_worker_cpus{pid}
+
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+                   "NUMEXPR_NUM_THREADS", "VECLIB_MAXIMUM_THREADS")
+
+# Threadpoolctl limiter for this process; kept so the limits stay applied
+_limits = None
+_budget = None
+_gauges = None
+
+
+def gauges():
+    # Created on first use: gunicorn.conf.py imports this module before
+    # the thread variables are set, and metrics imports NumPy
+    global _gauges
+    if _gauges is None:
+        from metrics import Gauge
+        _gauges = (
+            Gauge("emotion_worker_threads", "Effective threads per pool in each worker process",
+                  labelnames=("pid", "pool")),
+            Gauge("emotion_worker_cpus", "CPUs each worker process may run on", labelnames=("pid",)),
+        )
+    return _gauges
+
+
+def available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    import psutil
+    return list(range(psutil.cpu_count(logical=True) or 1))
+
+
+def plan(workers, cpus=None):
+    # Threads per worker for `workers` processes sharing `cpus`
+    cpus = available_cpus() if cpus is None else cpus
+    return max(1, len(cpus) // max(1, workers))
+
+
+def cpu_slice(slot, workers, cpus=None):
+    # CPUs of worker `slot` (0 .. workers-1): contiguous, equal-sized
+    # blocks; with more workers than CPUs, workers share CPUs round-robin
+    cpus = available_cpus() if cpus is None else cpus
+    if workers >= len(cpus):
+        return [cpus[slot % len(cpus)]]
+    size = len(cpus) // workers
+    return cpus[slot * size:(slot + 1) * size]
+
+
+def set_thread_env(threads):
+    # For pools that are created later in this process (and its children)
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+
+
+def apply(threads, cpus=None, torch_threads=None):
+    # Limit this process to `threads` per pool and optionally pin it
+    global _limits, _budget
+    from threadpoolctl import threadpool_limits
+
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+
+    set_thread_env(threads)
+    _limits = threadpool_limits(limits=threads)
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(torch_threads or threads)
+
+    _budget = threads
+    budgets = publish()
+    print(f"⚙️ Worker {os.getpid()}: {threads} threads per pool on {budgets['cpus']} CPUs "
+          f"(blas {budgets['blas']}, openmp {budgets['openmp']}, torch {budgets['torch']})")
+    return budgets
+
+
+def effective():
+    # Threads the loaded pools actually use now (0 = pool not loaded)
+    from threadpoolctl import threadpool_info
+
+    budgets = {"budget": _budget or 0, "blas": 0, "openmp": 0, "torch": 0}
+    for pool in threadpool_info():
+        api = pool.get("user_api")
+        if api in budgets:
+            budgets[api] = max(budgets[api], pool.get("num_threads") or 0)
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        budgets["torch"] = torch.get_num_threads()
+    budgets["cpus"] = len(available_cpus())
+    return budgets
+
+
+def publish():
+    budgets = effective()
+    worker_threads, worker_cpus = gauges()
+    pid = os.getpid()
+    for pool in ("budget", "blas", "openmp", "torch"):
+        worker_threads.labels(pid=pid, pool=pool).set(budgets[pool])
+    worker_cpus.labels(pid=pid).set(budgets["cpus"])
+    return budgets
@@ -1,94 +1,522 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import numpy as np
 import pandas as pd
-import re
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer, TfidfVectorizer
 from sklearn.preprocessing import LabelEncoder
 from sklearn.naive_bayes import MultinomialNB
 from sklearn.utils import resample
 import pickle
+from model_bundle import export_bundle, load_bundle
+from preprocessing import clean_series, clean_texts
+from stage_cache import ARRAYS, FRAME, JSON, PICKLE, StageCache, file_digest
 
-# --- Step 1: Load Dataset ---
-df = pd.read_csv("go_emotions_dataset.csv")
+# Class balancing strategies (Step 5):
+#   upsample       copy text rows until every emotion has max_size samples
+#                  (original behaviour, tokenizes every duplicate again)
+#   upsample-rows  same resampled rows, but each unique text is tokenized once
+#                  and duplicates are CSR row indices; vocabulary, idf and the
+#                  fitted model are identical to "upsample"
+#   weighted       TF-IDF on the unique texts, balancing through per-class
+#                  sample_weight in MultinomialNB.fit (no duplication at all)
+BALANCE_MODES = ("upsample", "upsample-rows", "weighted")
 
-# --- Step 2: Identify Emotion Columns Dynamically ---
-emotion_columns = df.columns[3:]  # emotion labels start from 4th column
-texts = df["text"]
+MAX_FEATURES = 5000
+NGRAM_RANGE = (1, 2)
+ALPHA = 0.5
 
-# Keep only rows that have at least one emotion label
-valid_rows = df[emotion_columns].sum(axis=1) > 0
-df = df[valid_rows]
+ARTIFACT_FILES = ("emotion_model.pkl", "vectorizer.pkl", "label_encoder.pkl")
 
-# Extract emotion names directly (not numeric indices)
-emotion_labels = df[emotion_columns].idxmax(axis=1)
 
-# --- Step 3: Combine into one clean DataFrame ---
-data = pd.DataFrame({
-    "text": df["text"],
-    "emotion": emotion_labels
-}).dropna()
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
 
-print(f"✅ Loaded {len(data)} samples with {data['emotion'].nunique()} unique emotions.")
-print("🎭 Sample emotions:", data["emotion"].unique()[:10])
 
-# --- Step 4: Text Cleaning Function ---
-def clean_text(text):
-    text = str(text).lower()
-    text = re.sub(r"http\S+", "", text)  # remove URLs
-    text = re.sub(r"[^a-z\s]", "", text)  # keep only letters and spaces
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
+# --- Step 1-3: Load Dataset and Extract Labels ---
+def read_dataset(path):
+    return pd.read_csv(path)
 
-data["text"] = data["text"].apply(clean_text)
 
-# --- Step 5: Handle Class Imbalance (Upsampling) ---
-max_size = data["emotion"].value_counts().max()
-balanced_data = pd.concat([
-    resample(
-        data[data["emotion"] == emotion],
-        replace=True,
-        n_samples=max_size,
-        random_state=42
-    )
-    for emotion in data["emotion"].unique()
-])
+def extract_labels(df):
+    # Identify emotion columns dynamically: labels start from 4th column
+    emotion_columns = df.columns[3:]
 
-balanced_data = balanced_data.sample(frac=1, random_state=42).reset_index(drop=True)
+    # Keep only rows that have at least one emotion label
+    valid_rows = df[emotion_columns].sum(axis=1) > 0
+    df = df[valid_rows]
+
+    # Extract emotion names directly (not numeric indices)
+    emotion_labels = df[emotion_columns].idxmax(axis=1)
+
+    # Combine into one clean DataFrame
+    return pd.DataFrame({
+        "text": df["text"],
+        "emotion": emotion_labels
+    }).dropna()
+
+
+def load_dataset(path):
+    data = extract_labels(read_dataset(path))
+    print(f"✅ Loaded {len(data)} samples with {data['emotion'].nunique()} unique emotions.")
+    print("🎭 Sample emotions:", data["emotion"].unique()[:10])
+    return data
+
+
+# --- Step 5: Handle Class Imbalance ---
+def upsample_positions(emotions):
+    # Row positions of the upsampled, shuffled dataset: the same draws as
+    # resampling each emotion's rows and shuffling the concatenated frame
+    emotions = np.asarray(emotions)
+    max_size = pd.Series(emotions).value_counts().max()
+    positions = np.concatenate([
+        resample(
+            np.flatnonzero(emotions == emotion),
+            replace=True,
+            n_samples=max_size,
+            random_state=42
+        )
+        for emotion in pd.unique(emotions)
+    ])
+    return pd.Series(positions).sample(frac=1, random_state=42).to_numpy()
+
+
+def balance_upsample(data):
+    positions = upsample_positions(data["emotion"])
+
+    print("✅ Dataset balanced successfully.")
+    print(data["emotion"].iloc[positions].value_counts().head())
+    return {"positions": positions}
+
+
+def balance_weighted(data):
+    # Each class is weighted by how many times upsampling would have copied it
+    class_counts = data["emotion"].value_counts()
+    class_weight = class_counts.max() / class_counts
+
+    print("✅ Class weights computed.")
+    print(class_weight.sort_values().head())
+    return {"sample_weight": class_weight[data["emotion"]].to_numpy()}
+
+
+BALANCE = {
+    "upsample": balance_upsample,
+    "upsample-rows": balance_upsample,
+    "weighted": balance_weighted,
+}
 
-print("✅ Dataset balanced successfully.")
-print(balanced_data["emotion"].value_counts().head())
 
 # --- Step 6: TF-IDF Vectorization ---
-vectorizer = TfidfVectorizer(max_features=5000, ngram_range=(1, 2))
-X = vectorizer.fit_transform(balanced_data["text"])
-
-# --- Step 7: Encode Labels ---
-label_encoder = LabelEncoder()
-y = label_encoder.fit_transform(balanced_data["emotion"])
-
-# --- Step 8: Train Naive Bayes Model ---
-model = MultinomialNB(alpha=0.5)
-model.fit(X, y)
-
-# --- Step 9: Save Model, Vectorizer, and Label Encoder ---
-pickle.dump(model, open("emotion_model.pkl", "wb"))
-pickle.dump(vectorizer, open("vectorizer.pkl", "wb"))
-pickle.dump(label_encoder, open("label_encoder.pkl", "wb"))
-
-print("✅ Model retrained and saved successfully.")
-
-# --- Step 10: Test with Sample Sentences ---
-test_sentences = [
-    "I am so happy today!",
-    "This is the worst day ever.",
-    "I feel really sad and alone.",
-    "You are such a wonderful friend.",
-    "I am nervous about tomorrow's exam.",
-    "I can’t believe this happened!",
-    "Everything feels peaceful now."
-]
-
-X_test = vectorizer.transform([clean_text(s) for s in test_sentences])
-y_pred = label_encoder.inverse_transform(model.predict(X_test))
-
-print("\n🎯 Sample Predictions:")
-for sentence, emotion in zip(test_sentences, y_pred):
-    print(f"→ {sentence}  →  {emotion}")
+def make_vectorizer(max_features=MAX_FEATURES, ngram_range=NGRAM_RANGE):
+    return TfidfVectorizer(max_features=max_features, ngram_range=ngram_range)
+
+
+def restore_vectorizer(terms, idf, max_features=MAX_FEATURES, ngram_range=NGRAM_RANGE):
+    # Fitted TfidfVectorizer from its vocabulary (terms in column order) and idf
+    vectorizer = make_vectorizer(max_features, ngram_range)
+    vectorizer.vocabulary_ = {str(term): i for i, term in enumerate(terms)}
+    vectorizer.fixed_vocabulary_ = False
+    vectorizer.idf_ = np.asarray(idf, dtype=np.float64)
+    return vectorizer
+
+
+def vectorize_upsample(data, balanced):
+    balanced_data = data.iloc[balanced["positions"]].reset_index(drop=True)
+
+    vectorizer = make_vectorizer()
+    X = vectorizer.fit_transform(balanced_data["text"])
+    return vectorizer, X, balanced_data["emotion"], None
+
+
+def vectorize_upsample_rows(data, balanced):
+    # Tokenize each distinct text once, then build the upsampled matrix by
+    # repeating CSR rows instead of repeating strings
+    positions = balanced["positions"]
+    codes, unique_texts = pd.factorize(data["text"].iloc[positions])
+    emotions = data["emotion"].iloc[positions].reset_index(drop=True)
+
+    # Reproduce TfidfVectorizer.fit_transform on the upsampled texts step by
+    # step. pd.factorize keeps first-occurrence order, so counting the
+    # distinct texts assigns the same provisional term ids; the columns are
+    # then renumbered alphabetically without re-sorting each row, as sklearn
+    # does, which keeps the float summation order (and the model) identical.
+    counter = CountVectorizer(ngram_range=NGRAM_RANGE, dtype=np.float64)
+    vocabulary, unique_counts = counter._count_vocab(unique_texts, False)
+    terms = np.array(sorted(vocabulary))
+    map_index = np.empty(len(terms), dtype=unique_counts.indices.dtype)
+    for new_index, term in enumerate(terms):
+        map_index[vocabulary[term]] = new_index
+    unique_counts.indices = map_index.take(unique_counts.indices, mode="clip")
+    counts = unique_counts[codes]
+    del unique_counts
+
+    # Keep the MAX_FEATURES most frequent terms (CountVectorizer._limit_features)
+    mask = np.ones(len(terms), dtype=bool)
+    if mask.sum() > MAX_FEATURES:
+        tfs = np.asarray(counts.sum(axis=0)).ravel()
+        mask_inds = (-tfs[mask]).argsort()[:MAX_FEATURES]
+        new_mask = np.zeros(len(terms), dtype=bool)
+        new_mask[np.where(mask)[0][mask_inds]] = True
+        mask = new_mask
+    kept_indices = np.where(mask)[0]
+
+    counts = counts[:, kept_indices]
+    transformer = TfidfTransformer().fit(counts)
+    X = transformer.transform(counts, copy=False)
+
+    vectorizer = restore_vectorizer(terms[kept_indices], transformer.idf_)
+    return vectorizer, X, emotions, None
+
+
+def vectorize_weighted(data, balanced):
+    # No duplication: TF-IDF is fitted on the distinct texts and the
+    # balancing is left to the sample weights
+    codes, unique_texts = pd.factorize(data["text"])
+    vectorizer = make_vectorizer()
+    X = vectorizer.fit_transform(unique_texts)[codes]
+    return vectorizer, X, data["emotion"].reset_index(drop=True), balanced["sample_weight"]
+
+
+VECTORIZE = {
+    "upsample": vectorize_upsample,
+    "upsample-rows": vectorize_upsample_rows,
+    "weighted": vectorize_weighted,
+}
+
+
+# --- Step 7-8: Encode Labels and Train Naive Bayes Model ---
+def fit_model(X, emotions, sample_weight, alpha=ALPHA):
+    label_encoder = LabelEncoder()
+    y = label_encoder.fit_transform(emotions)
+
+    model = MultinomialNB(alpha=alpha)
+    model.fit(X, y, sample_weight=sample_weight)
+    return model, label_encoder
+
+
+def train(data, balance, alpha=ALPHA):
+    # In-memory training on already cleaned data (no stage cache)
+    balanced = BALANCE[balance](data)
+    vectorizer, X, emotions, sample_weight = VECTORIZE[balance](data, balanced)
+    model, label_encoder = fit_model(X, emotions, sample_weight, alpha)
+    return model, vectorizer, label_encoder
+
+
+# --- Cached training pipeline ---
+# The same steps as train(), split into stages whose outputs are stored in
+# a content-addressed cache (stage_cache.py):
+#   load       CSV -> raw frame                     key: CSV content hash
+#   label      text + emotion frame
+#   clean      cleaned texts
+#   balance    upsampled row positions or sample weights   param: balance
+#   vectorize  TF-IDF matrix, vocabulary, idf, labels      params: features
+#   fit        MultinomialNB + LabelEncoder                param: alpha
+#   export     .pkl files and model bundle
+# Every key is computed up front and the stages are deferred (StageCache.lazy):
+# a rerun loads only the last cached stage before the first one that
+# changed and recomputes from there, e.g. a new --alpha loads the
+# vectorized matrix and refits, and an unchanged rerun reads just the fit
+# output and checks the exported artifacts. The fit stage keeps the
+# restored vectorizer and row count so that run needs nothing else.
+# Labels are extracted before cleaning, as load_dataset() always did, so
+# rows whose text is missing are dropped rather than cleaned to "nan".
+def vectorize_stage(data, balanced, balance):
+    vectorizer, X, emotions, sample_weight = VECTORIZE[balance](data, balanced)
+    terms = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+    arrays = {
+        "X": X,
+        "terms": np.array(terms, dtype=str),
+        "idf": vectorizer.idf_,
+        "emotions": np.asarray(emotions, dtype=str),
+    }
+    if sample_weight is not None:
+        arrays["sample_weight"] = sample_weight
+    return arrays
+
+
+def fit_stage(vectorized, alpha):
+    model, label_encoder = fit_model(
+        vectorized["X"], vectorized["emotions"].astype(object), vectorized.get("sample_weight"), alpha)
+    return {
+        "model": model,
+        "label_encoder": label_encoder,
+        "vectorizer": restore_vectorizer(vectorized["terms"], vectorized["idf"]),
+        "rows": len(vectorized["emotions"]),
+    }
+
+
+def data_stages(path, cache):
+    # Deferred load, label and clean stages: a callable returning the cleaned
+    # text + emotion frame, and its key
+    key = cache.key("load", file_digest(path))
+    raw = cache.lazy("load", key, FRAME, lambda: read_dataset(path))
+
+    key = cache.key("label", key)
+    labelled = cache.lazy("label", key, FRAME, lambda: extract_labels(raw()))
+
+    # --- Step 4: Text Cleaning (preprocessing.clean_text, shared with app.py) ---
+    def clean():
+        data = labelled()
+        return data.assign(text=clean_series(data["text"]))
+
+    key = cache.key("clean", key)
+    return cache.lazy("clean", key, FRAME, clean), key
+
+
+def prepare_data(path, cache):
+    # load, label and clean stages: the cleaned text + emotion frame and its key
+    data, key = data_stages(path, cache)
+    data = data()
+    print(f"✅ Loaded {len(data)} samples with {data['emotion'].nunique()} unique emotions.")
+    print("🎭 Sample emotions:", data["emotion"].unique()[:10])
+    return data, key
+
+
+def train_cached(path, balance, cache, alpha=ALPHA, export=True):
+    data, key = data_stages(path, cache)
+
+    key = cache.key("balance", key, {"balance": "upsample" if balance == "upsample-rows" else balance})
+    balanced = cache.lazy("balance", key, ARRAYS, lambda: BALANCE[balance](data()))
+
+    # upsample and upsample-rows build the same matrix, so they share the entry
+    key = cache.key("vectorize", key, {
+        "max_features": MAX_FEATURES, "ngram_range": NGRAM_RANGE, "sublinear_tf": False,
+    })
+    vectorized = cache.lazy("vectorize", key, ARRAYS, lambda: vectorize_stage(data(), balanced(), balance))
+
+    key = cache.key("fit", key, {"alpha": alpha})
+    fitted = cache.run("fit", key, PICKLE, lambda: fit_stage(vectorized(), alpha))
+    model, vectorizer, label_encoder = fitted["model"], fitted["vectorizer"], fitted["label_encoder"]
+
+    if export:
+        export_stage(cache, cache.key("export", key), model, vectorizer, label_encoder)
+    return model, vectorizer, label_encoder, fitted["rows"]
+
+
+def export_stage(cache, key, model, vectorizer, label_encoder):
+    # Skipped when the artifacts on disk are the ones this key produced
+    stamp = cache.get("export", key, JSON)
+    if stamp is not None and all(os.path.exists(name) for name in ARTIFACT_FILES):
+        try:
+            bundle_version = load_bundle("model_bundle").version
+        except (OSError, ValueError):
+            bundle_version = None
+        if bundle_version == stamp["bundle_version"]:
+            print(f"♻️ Stage export: artifacts up to date ({key}, bundle {bundle_version})")
+            return
+
+    manifest = save_artifacts(model, vectorizer, label_encoder)
+    cache.put("export", key, JSON, {"bundle_version": manifest["version"]})
+
+
+# --- Streaming (out-of-core) training ---
+# The CSV is read STREAM_CHUNK_ROWS rows at a time and never held whole:
+#   pass 1  count labels plus term frequency / document frequency per term
+#           (merged chunk by chunk into one table)
+#   pass 2  vectorize each chunk with the fixed vocabulary and idf from
+#           pass 1 and update MultinomialNB through partial_fit
+# Rows cannot be upsampled without holding them, so classes are balanced
+# with per-class sample weights as in --balance weighted. Memory depends on
+# the chunk size and the number of distinct terms, not on the row count;
+# the term table is pruned to its most frequent half whenever it grows past
+# max_tracked_terms.
+STREAM_CHUNK_ROWS = 20000
+MAX_TRACKED_TERMS = 2_000_000
+
+
+def iter_chunks(path, chunksize):
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        data = extract_labels(chunk)
+        if len(data):
+            yield clean_series(data["text"]), data["emotion"]
+
+
+def count_terms(path, chunksize, max_tracked_terms):
+    # Pass 1: label counts and per-term (term frequency, document frequency)
+    label_counts = pd.Series(dtype=np.int64)
+    term_stats = {}
+    n_documents = 0
+    counter = CountVectorizer(ngram_range=NGRAM_RANGE)
+
+    for texts, emotions in iter_chunks(path, chunksize):
+        label_counts = label_counts.add(emotions.value_counts(), fill_value=0)
+        n_documents += len(texts)
+        try:
+            counts = counter.fit_transform(texts)
+        except ValueError:  # chunk without a single token
+            continue
+
+        chunk_tf = np.asarray(counts.sum(axis=0)).ravel()
+        chunk_df = np.bincount(counts.indices, minlength=counts.shape[1])
+        for term, tf, df in zip(counter.get_feature_names_out(), chunk_tf.tolist(), chunk_df.tolist()):
+            stats = term_stats.get(term)
+            if stats is None:
+                term_stats[term] = [tf, df]
+            else:
+                stats[0] += tf
+                stats[1] += df
+
+        if len(term_stats) > max_tracked_terms:
+            keep = sorted(term_stats.items(), key=lambda item: -item[1][0])[:max_tracked_terms // 2]
+            term_stats = dict(keep)
+            print(f"⚠️ Term table pruned to {len(term_stats)} terms")
+
+    return label_counts.astype(np.int64), term_stats, n_documents
+
+
+def build_streaming_vectorizer(term_stats, n_documents):
+    # MAX_FEATURES most frequent terms and smoothed idf, computed as in
+    # TfidfVectorizer.fit
+    terms = sorted(term_stats)
+    tfs = np.array([term_stats[term][0] for term in terms])
+    kept = np.sort((-tfs).argsort()[:MAX_FEATURES])
+    dfs = np.array([term_stats[terms[i]][1] for i in kept], dtype=np.float64)
+
+    vectorizer = make_vectorizer()
+    vectorizer.vocabulary_ = {terms[i]: column for column, i in enumerate(kept)}
+    vectorizer.idf_ = np.log((1 + n_documents) / (1 + dfs)) + 1
+    return vectorizer
+
+
+def train_streaming(path, chunksize=STREAM_CHUNK_ROWS, max_tracked_terms=MAX_TRACKED_TERMS, alpha=ALPHA):
+    label_counts, term_stats, n_documents = count_terms(path, chunksize, max_tracked_terms)
+    print(f"✅ Pass 1: {n_documents} samples, {len(label_counts)} emotions, {len(term_stats)} terms.")
+
+    vectorizer = build_streaming_vectorizer(term_stats, n_documents)
+    del term_stats
+
+    label_encoder = LabelEncoder().fit(label_counts.index)
+    class_weight = (label_counts.max() / label_counts)[label_encoder.classes_].to_numpy()
+    classes = np.arange(len(label_encoder.classes_))
+
+    model = MultinomialNB(alpha=alpha)
+    for texts, emotions in iter_chunks(path, chunksize):
+        y = label_encoder.transform(emotions)
+        model.partial_fit(vectorizer.transform(texts), y, classes=classes, sample_weight=class_weight[y])
+
+    print(f"✅ Pass 2: model fitted on {n_documents} samples in chunks of {chunksize}.")
+    return model, vectorizer, label_encoder, n_documents
+
+
+def save_artifacts(model, vectorizer, label_encoder):
+    # --- Step 9: Save Model, Vectorizer, and Label Encoder ---
+    pickle.dump(model, open("emotion_model.pkl", "wb"))
+    pickle.dump(vectorizer, open("vectorizer.pkl", "wb"))
+    pickle.dump(label_encoder, open("label_encoder.pkl", "wb"))
+
+    # Versioned, memory-mappable bundle that app.py serves from
+    manifest = export_bundle(vectorizer, model, label_encoder, "model_bundle")
+    print(f"✅ Model bundle {manifest['version']} exported to model_bundle/")
+
+    print("✅ Model retrained and saved successfully.")
+    return manifest
+
+
+def show_sample_predictions(model, vectorizer, label_encoder):
+    # --- Step 10: Test with Sample Sentences ---
+    test_sentences = [
+        "I am so happy today!",
+        "This is the worst day ever.",
+        "I feel really sad and alone.",
+        "You are such a wonderful friend.",
+        "I am nervous about tomorrow's exam.",
+        "I can’t believe this happened!",
+        "Everything feels peaceful now."
+    ]
+
+    X_test = vectorizer.transform(clean_texts(test_sentences))
+    y_pred = label_encoder.inverse_transform(model.predict(X_test))
+
+    print("\n🎯 Sample Predictions:")
+    for sentence, emotion in zip(test_sentences, y_pred):
+        print(f"→ {sentence}  →  {emotion}")
+
+
+def compare_balance_modes(args):
+    # Each mode in a fresh process so peak RSS is measured independently
+    runs = [["--balance", mode] for mode in BALANCE_MODES]
+    runs.append(["--stream", "--chunksize", str(args.chunksize)])
+
+    rows = []
+    for extra in runs:
+        out = subprocess.run(
+            [sys.executable, __file__, "--data", args.data, "--no-save", "--no-cache", "--report-json", *extra],
+            capture_output=True, text=True, check=True,
+        )
+        rows.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print(f"\n{'balance mode':<16}{'rows fitted':>12}{'wall s':>9}{'peak RSS MB':>13}")
+    for row in rows:
+        print(f"{row['balance']:<16}{row['rows']:>12}{row['wall_seconds']:>9.1f}{row['peak_rss_mb']:>13.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the emotion recognition model")
+    parser.add_argument("--data", default="go_emotions_dataset.csv")
+    parser.add_argument("--balance", choices=BALANCE_MODES,
+                        help="class balancing strategy (default: upsample)")
+    parser.add_argument("--alpha", type=float, default=ALPHA,
+                        help=f"MultinomialNB smoothing (default {ALPHA})")
+    parser.add_argument("--stream", action="store_true",
+                        help="train out of core from CSV chunks with partial_fit")
+    parser.add_argument("--chunksize", type=int, default=STREAM_CHUNK_ROWS,
+                        help=f"rows per chunk with --stream (default {STREAM_CHUNK_ROWS})")
+    parser.add_argument("--no-save", action="store_true", help="train without writing artifacts")
+    parser.add_argument("--cache-dir", default=".train_cache",
+                        help="stage cache directory (default .train_cache)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="recompute every stage and do not write the stage cache")
+    parser.add_argument("--report-json", action="store_true",
+                        help="print wall time and peak RSS as a JSON line")
+    parser.add_argument("--compare-balance", action="store_true",
+                        help="train with every balance mode and report time and memory")
+    parser.add_argument("--registry",
+                        help="also publish the bundle as a new version in this model registry")
+    parser.add_argument("--activate", action="store_true",
+                        help="with --registry, make the new version the ACTIVE one")
+    args = parser.parse_args()
+
+    if args.compare_balance:
+        compare_balance_modes(args)
+        return
+
+    if args.stream and args.balance not in (None, "weighted"):
+        parser.error("--stream balances with class weights; --balance must be weighted")
+
+    started = time.perf_counter()
+    if args.stream:
+        args.balance = "stream"
+        model, vectorizer, label_encoder, rows = train_streaming(args.data, args.chunksize, alpha=args.alpha)
+        if not args.no_save:
+            save_artifacts(model, vectorizer, label_encoder)
+    else:
+        args.balance = args.balance or "upsample"
+        cache = StageCache(args.cache_dir, enabled=not args.no_cache)
+        model, vectorizer, label_encoder, rows = train_cached(
+            args.data, args.balance, cache, alpha=args.alpha, export=not args.no_save)
+    wall_seconds = time.perf_counter() - started
+
+    show_sample_predictions(model, vectorizer, label_encoder)
+
+    if args.registry and not args.no_save:
+        from model_registry import ModelRegistry
+        version = ModelRegistry(args.registry).publish("model_bundle", activate=args.activate)
+        print(f"✅ Published model version {version} to {args.registry}/"
+              f"{' (active)' if args.activate else ''}")
+
+    print(f"\n⏱️ Balance mode {args.balance}: {wall_seconds:.1f}s wall, peak RSS {peak_rss_mb():.0f} MB")
+    if args.report_json:
+        print(json.dumps({
+            "balance": args.balance,
+            "rows": rows,
+            "wall_seconds": wall_seconds,
+            "peak_rss_mb": peak_rss_mb(),
+        }))
+
+
+if __name__ == "__main__":
+    main()
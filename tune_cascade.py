@@ -0,0 +1,152 @@
+import argparse
+import json
+import time
+import numpy as np
+
+from backends import NaiveBayesBackend, TransformerBackend
+from evaluate import CHUNK_SIZE, holdout_split
+from inference import FusedScorer
+from model_bundle import load_bundle
+from preprocessing import clean_series, clean_texts
+from train_model import extract_labels, read_dataset, train
+
+# ------------------------------------------------------------
+# 🔹 Cascade Threshold Tuning (offline)
+# ------------------------------------------------------------
+# Usage:
+#     python tune_cascade.py --target 0.60
+#     python tune_cascade.py --target 0.60 --labelled labelled.csv
+#
+# Scores a labelled set with both cascade tiers (NB and the transformer
+# from TRANSFORMER_MODEL_DIR) and finds the lowest CASCADE_THRESHOLD whose
+# cascade accuracy reaches --target, i.e. the one that escalates the
+# fewest texts.
+#
+# Labelled set:
+#   default     the stratified holdout of --data (same split as
+#               evaluate.py), with NB retrained on the other 80% so the
+#               holdout is unseen
+#   --labelled  a CSV in the training format, scored with the deployed
+#               NB model (model_bundle/)
+#
+# With texts sorted by NB confidence, threshold t escalates exactly the
+# texts below t, so the accuracy of every threshold comes from two
+# cumulative sums: slow-tier hits among the escalated texts plus fast-tier
+# hits among the rest.
+
+
+def threshold_curve(confidence, fast_correct, slow_correct):
+    # One row per distinct threshold: (threshold, escalated fraction, accuracy)
+    order = np.argsort(confidence, kind="stable")
+    confidence = np.asarray(confidence)[order]
+    fast_hits = np.concatenate([[0], np.cumsum(np.asarray(fast_correct)[order])])
+    slow_hits = np.concatenate([[0], np.cumsum(np.asarray(slow_correct)[order])])
+    n = len(confidence)
+
+    # Escalating the k least confident texts for every k at which the
+    # threshold can fall, i.e. where the confidence changes, plus "all"
+    ks = np.concatenate([[0], np.flatnonzero(np.diff(confidence) > 0) + 1, [n]])
+    thresholds = np.append(confidence, np.nextafter(1.0, 2.0))[ks]
+    accuracy = (slow_hits[ks] + fast_hits[n] - fast_hits[ks]) / n
+    return thresholds, ks / n, accuracy
+
+
+def pick_threshold(thresholds, escalation, accuracy, target):
+    reaching = np.flatnonzero(accuracy >= target)
+    if not len(reaching):
+        return None
+    best = reaching[0]  # lowest threshold, fewest escalations
+    return {
+        "threshold": float(thresholds[best]),
+        "escalation_rate": float(escalation[best]),
+        "accuracy": float(accuracy[best]),
+    }
+
+
+def score_in_chunks(backend, texts, chunk_size=CHUNK_SIZE):
+    rows, seconds = [], 0.0
+    for start in range(0, len(texts), chunk_size):
+        chunk = texts[start:start + chunk_size]
+        started = time.perf_counter()
+        rows.append(backend.predict_proba(chunk))
+        seconds += time.perf_counter() - started
+    return np.vstack(rows), seconds / len(texts) * 1e6
+
+
+def load_labelled_set(args):
+    # Raw texts, true label names and the NB tier to evaluate them with
+    if args.labelled:
+        data = extract_labels(read_dataset(args.labelled))
+        bundle = load_bundle(args.bundle)
+        fast = NaiveBayesBackend(bundle.labels, bundle.version, scorer=FusedScorer.from_bundle(bundle))
+        return data["text"].astype(str).tolist(), data["emotion"].to_numpy(), fast
+
+    data = extract_labels(read_dataset(args.data))
+    labels, y = np.unique(data["emotion"].to_numpy(), return_inverse=True)
+    train_rows, holdout_rows = holdout_split(y)
+    training = data.iloc[train_rows].assign(text=lambda d: clean_series(d["text"]))
+    model, vectorizer, label_encoder = train(training, args.balance)
+    fast = NaiveBayesBackend(
+        label_encoder.inverse_transform(model.classes_), "holdout",
+        scorer=FusedScorer.from_sklearn(vectorizer, model),
+    )
+    holdout = data.iloc[holdout_rows]
+    return holdout["text"].astype(str).tolist(), holdout["emotion"].to_numpy(), fast
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pick the cascade threshold for a target accuracy")
+    parser.add_argument("--target", type=float, required=True, help="cascade accuracy to reach")
+    parser.add_argument("--data", default="go_emotions_dataset.csv")
+    parser.add_argument("--labelled", help="separate labelled CSV (scored with the deployed NB bundle)")
+    parser.add_argument("--bundle", default="model_bundle")
+    parser.add_argument("--balance", default="upsample-rows", help="NB balancing when retraining")
+    parser.add_argument("--output", help="write the threshold curve as JSON")
+    args = parser.parse_args()
+
+    texts, truth, fast = load_labelled_set(args)
+    slow = TransformerBackend.from_env(labels=fast.labels)
+    labels = np.asarray(fast.labels).astype(str)
+    print(f"✅ {len(texts)} labelled texts, slow tier from {slow.model_dir}")
+
+    fast_proba, fast_us = score_in_chunks(fast, clean_texts(texts))
+    slow_proba, slow_us = score_in_chunks(slow, texts)
+    confidence = fast_proba.max(axis=1)
+    fast_correct = labels[fast_proba.argmax(axis=1)] == truth
+    slow_correct = labels[slow_proba.argmax(axis=1)] == truth
+
+    thresholds, escalation, accuracy = threshold_curve(confidence, fast_correct, slow_correct)
+    print(f"\nNB alone {fast_correct.mean():.4f} ({fast_us:.0f} us/text)   "
+          f"transformer alone {slow_correct.mean():.4f} ({slow_us:.0f} us/text)")
+
+    print(f"\n{'threshold':>10}{'escalated':>11}{'accuracy':>10}{'est. us/text':>14}")
+    for t in np.arange(0.1, 1.0, 0.1):
+        i = np.searchsorted(thresholds, t)  # first threshold >= t escalates the same texts
+        print(f"{t:>10.2f}{escalation[i]:>11.1%}{accuracy[i]:>10.4f}{fast_us + escalation[i] * slow_us:>14.0f}")
+
+    choice = pick_threshold(thresholds, escalation, accuracy, args.target)
+    if choice is None:
+        print(f"\n⚠️ No threshold reaches accuracy {args.target} (best {accuracy.max():.4f})")
+    else:
+        choice["estimated_us_per_text"] = fast_us + choice["escalation_rate"] * slow_us
+        print(f"\n🎯 CASCADE_THRESHOLD={choice['threshold']:.6f}: accuracy {choice['accuracy']:.4f}, "
+              f"escalates {choice['escalation_rate']:.1%}, ~{choice['estimated_us_per_text']:.0f} us/text")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "target": args.target,
+                "choice": choice,
+                "fast_us_per_text": fast_us,
+                "slow_us_per_text": slow_us,
+                "curve": {
+                    "threshold": thresholds.tolist(),
+                    "escalation_rate": escalation.tolist(),
+                    "accuracy": accuracy.tolist(),
+                },
+            }, f, indent=2)
+        print(f"✅ Curve written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
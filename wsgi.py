@@ -0,0 +1,6 @@
+from app import app
+
+# ------------------------------------------------------------
+# 🔹 WSGI Entry Point
+# ------------------------------------------------------------
+# gunicorn -c gunicorn.conf.py wsgi:app